@@ -3,13 +3,30 @@ import feedparser
 from datetime import datetime, timedelta
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 from deep_translator import GoogleTranslator
-from bs4 import BeautifulSoup
 import pytz
 import pandas as pd
+import numpy as np
 import json
+import hashlib
 import time
 import sqlite3
 import os
+import math
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from market_core import (
+    RSS_FEEDS, ASSETS, ALERT_RULES_FILE, AlertRuleEngine, clean_html, classify_assets, article_key,
+    parse_published, init_meta_table, get_db_meta, set_db_meta, init_news_table, insert_articles
+)
+from batch_sentiment import BatchSentimentScorer
+from shared_cache import SharedCache, create_backend
+from resilience import CircuitBreaker, Deadline
+from reports import (
+    REPORT_FORMATS, init_report_tables, snapshot_hash, build_full_report,
+    save_artifacts, get_latest_artifact, export_reports_zip
+)
 
 # พยายาม import yfinance แต่ถ้าไม่มีให้ใช้ fallback
 try:
@@ -36,6 +53,12 @@ def init_database():
         conn = sqlite3.connect('market_data.db')
         c = conn.cursor()
         
+        # เปิด incremental vacuum (ต้อง VACUUM หนึ่งครั้งถ้า database เดิมยังไม่ได้ตั้งค่า)
+        c.execute('PRAGMA auto_vacuum')
+        if c.fetchone()[0] != 2:
+            c.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            c.execute('VACUUM')
+        
         c.execute('''CREATE TABLE IF NOT EXISTS market_analysis
                      (id INTEGER PRIMARY KEY, date TEXT, asset TEXT, 
                       sentiment REAL, article_count INTEGER, trend TEXT,
@@ -44,10 +67,56 @@ def init_database():
         c.execute('''CREATE TABLE IF NOT EXISTS price_data
                      (id INTEGER PRIMARY KEY, symbol TEXT, price REAL, 
                       change_percent REAL, timestamp TEXT)''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_price_data_timestamp
+                     ON price_data (timestamp)''')
+        
+        c.execute('''CREATE TABLE IF NOT EXISTS price_bars
+                     (symbol TEXT, resolution TEXT, bucket_start INTEGER,
+                      open REAL, high REAL, low REAL, close REAL, samples INTEGER,
+                      PRIMARY KEY (symbol, resolution, bucket_start))''')
+        
+        init_meta_table(c)
         
         c.execute('''CREATE TABLE IF NOT EXISTS important_news
                      (id INTEGER PRIMARY KEY, date TEXT, category TEXT,
                       title TEXT, link TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+        # คอลัมน์ที่เพิ่มสำหรับคิวการแจ้งเตือน (database เดิมยังไม่มี)
+        c.execute('PRAGMA table_info(important_news)')
+        columns = {row[1] for row in c.fetchall()}
+        for column, column_type in [('rule_id', 'TEXT'), ('summary', 'TEXT'), ('sentiment', 'REAL')]:
+            if column not in columns:
+                try:
+                    c.execute(f'ALTER TABLE important_news ADD COLUMN {column} {column_type}')
+                except sqlite3.OperationalError as e:
+                    # session อื่นเพิ่มคอลัมน์นี้ไปแล้วระหว่างที่เราอ่าน table_info
+                    if 'duplicate column' not in str(e):
+                        raise
+        
+        c.execute('''CREATE TABLE IF NOT EXISTS alert_seen
+                     (rule_id TEXT, guid TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                      PRIMARY KEY (rule_id, guid))''')
+        
+        init_news_table(c)
+        
+        c.execute('''CREATE TABLE IF NOT EXISTS economic_events
+                     (id INTEGER PRIMARY KEY, event_type TEXT, event TEXT,
+                      event_ts INTEGER, impact TEXT, UNIQUE (event_type, event_ts))''')
+        c.execute('''CREATE INDEX IF NOT EXISTS idx_economic_events_ts
+                     ON economic_events (event_ts)''')
+        
+        c.execute('''CREATE TABLE IF NOT EXISTS event_impact
+                     (event_type TEXT, symbol TEXT, window TEXT, mean_return REAL,
+                      std_return REAL, samples INTEGER,
+                      PRIMARY KEY (event_type, symbol, window))''')
+        
+        c.execute('''CREATE TABLE IF NOT EXISTS sentiment_index
+                     (asset TEXT PRIMARY KEY, value_sum REAL, weight_sum REAL,
+                      ref_ts REAL, last_article_id INTEGER, updated_at TEXT)''')
+        
+        c.execute('''CREATE TABLE IF NOT EXISTS last_known_good
+                     (key TEXT PRIMARY KEY, value TEXT, updated_at REAL)''')
+        
+        init_report_tables(c)
         
         conn.commit()
         conn.close()
@@ -59,30 +128,7 @@ def init_database():
 # เรียกใช้การตั้งค่า database
 db_initialized = init_database()
 
-def clean_html(raw_html):
-    if not raw_html:
-        return ""
-    try:
-        soup = BeautifulSoup(raw_html, "html.parser")
-        return soup.get_text()
-    except:
-        return raw_html
-
 # ---------- CONFIG ที่สอดคล้องกัน ----------
-RSS_FEEDS = [
-    "https://news.google.com/rss/search?q=gold+price+OR+XAUUSD&hl=en-US&gl=US&ceid=US:en",
-    "https://news.google.com/rss/search?q=silver+price+OR+XAGUSD&hl=en-US&gl=US&ceid=US:en",
-    "https://news.google.com/rss/search?q=bitcoin+OR+BTCUSD&hl=en-US&gl=US&ceid=US:en"
-]
-
-GOLD_KEYWORDS = ['gold', 'xau', 'bullion', 'precious metal', 'fed', 'inflation', 'dollar', 'usd', 'ทองคำ', 'xauusd']
-
-ASSETS = {
-    "ทองคำ (XAU)": GOLD_KEYWORDS,
-    "เงิน (XAG)": ["silver", "xagusd"],
-    "บิตคอยน์ (BTC)": ["bitcoin", "btc", "crypto"]
-}
-
 SYMBOLS = {
     "ทองคำ (XAU)": "GC=F",
     "เงิน (XAG)": "SI=F", 
@@ -91,10 +137,11 @@ SYMBOLS = {
 }
 
 analyzer = SentimentIntensityAnalyzer()
+sentiment_scorer = BatchSentimentScorer(analyzer)
 
 # ---------- 1. ข้อมูลราคาเรียลไทม์ (Fallback ถ้าไม่มี yfinance) ----------
-def get_live_prices():
-    """ดึงข้อมูลราคาเรียลไทม์"""
+def get_live_prices(deadline=None):
+    """ดึงข้อมูลราคาเรียลไทม์ (ภายในงบเวลา deadline) ถ้า upstream ไม่ตอบใช้ราคาล่าสุดจาก database"""
     if not HAS_YFINANCE:
         # Fallback prices ถ้าไม่มี yfinance
         fallback_prices = {
@@ -107,12 +154,12 @@ def get_live_prices():
     
     prices = {}
     for name, symbol in SYMBOLS.items():
+        error = None
         try:
-            ticker = yf.Ticker(symbol)
-            data = ticker.history(period="2d")
+            data = fetch_price_history(symbol, period="2d", ttl=PRICE_CACHE_TTL, timeout=upstream_timeout(deadline))
             if len(data) >= 2:
-                current_price = data['Close'][-1]
-                prev_price = data['Close'][-2]
+                current_price = data['Close'].iloc[-1]
+                prev_price = data['Close'].iloc[-2]
                 change = ((current_price - prev_price) / prev_price) * 100
                 prices[name] = {
                     'price': current_price,
@@ -122,10 +169,16 @@ def get_live_prices():
                 
                 # บันทึกลง database
                 save_price_data(name, symbol, current_price, change)
-                
+                continue
         except Exception as e:
-            st.error(f"Error fetching price for {name}: {str(e)}")
-            continue
+            error = e
+        
+        # upstream ช้าหรือล้มเหลว: ใช้ราคาล่าสุดที่บันทึกไว้ (แสดงอายุของข้อมูล)
+        last_price = load_last_price(symbol)
+        if last_price:
+            prices[name] = last_price
+        elif error:
+            st.error(f"Error fetching price for {name}: {str(error)}")
     
     return prices if prices else {
         "ทองคำ (XAU)": {'price': 1850.50, 'change': 0.25, 'symbol': 'GC=F'},
@@ -150,58 +203,91 @@ def save_price_data(asset, symbol, price, change):
         st.error(f"Error saving price data: {str(e)}")
 
 # ---------- 2. การแจ้งเตือนข่าวสำคัญ ----------
+@st.cache_resource
+def get_alert_engine(rules_mtime):
+    """คอมไพล์กฎจาก ALERT_RULES_FILE ใหม่เมื่อไฟล์เปลี่ยน (rules_mtime เป็น cache key)"""
+    try:
+        with open(ALERT_RULES_FILE, encoding='utf-8') as f:
+            return AlertRuleEngine(json.load(f))
+    except Exception as e:
+        st.error(f"Alert rules error: {str(e)}")
+        return AlertRuleEngine([])
+
 def check_important_news(articles):
-    """ตรวจสอบข่าวสำคัญที่อาจส่งผลต่อตลาด"""
-    important_keywords = {
-        "Fed": ["fed", "federal reserve", "jerome powell", "interest rate", "fomc"],
-        "เงินเฟ้อ": ["inflation", "cpi", "ppi", "consumer price", "เงินเฟ้อ"],
-        "การจ้างงาน": ["employment", "jobs report", "nfp", "unemployment", "nonfarm"],
-        "วิกฤตการณ์": ["crisis", "recession", "war", "conflict", "geopolitical"],
-        "นโยบายการเงิน": ["monetary policy", "quantitative easing", "tapering", "qe"]
-    }
+    """ตรวจข่าวใหม่ตามกฎแจ้งเตือน แจ้งเตือนครั้งเดียวต่อข่าวต่อกฎ และคืนการแจ้งเตือนที่เพิ่มเข้าคิว"""
+    rules_mtime = os.path.getmtime(ALERT_RULES_FILE) if os.path.exists(ALERT_RULES_FILE) else 0
+    engine = get_alert_engine(rules_mtime)
     
     alerts = []
-    for category, keywords in important_keywords.items():
-        for article in articles[:15]:  # ตรวจสอบ 15 ข่าวล่าสุด
-            content = (article['title'] + " " + article['summary_en']).lower()
-            if any(keyword in content for keyword in keywords):
-                alerts.append({
-                    'category': category,
-                    'title': article['title'],
-                    'link': article['link'],
-                    'summary': article['summary_en'][:200] + "..."
-                })
-                break
+    for article in articles:
+        for rule in engine.match(article):
+            alerts.append({
+                'rule_id': rule['id'],
+                'guid': article['guid'],
+                'category': rule.get('category', rule['id']),
+                'title': article['title'],
+                'link': article['link'],
+                'summary': article['summary_en'][:200] + "...",
+                'sentiment': article.get('sentiment')
+            })
     
-    # บันทึกข่าวสำคัญลง database
+    # บันทึกข่าวสำคัญลง database (ตัดรายการที่เคยแจ้งเตือนแล้ว)
     if db_initialized:
-        save_important_news(alerts)
+        return save_important_news(alerts)
     
-    return alerts
+    fresh = [alert for alert in alerts if (alert['rule_id'], alert['guid']) not in engine.seen]
+    engine.seen.update((alert['rule_id'], alert['guid']) for alert in fresh)
+    return fresh
 
 def save_important_news(alerts):
-    """บันทึกข่าวสำคัญลง database"""
+    """บันทึกข่าวสำคัญที่ยังไม่เคยแจ้งเตือนลงคิว (important_news) และคืนเฉพาะรายการใหม่"""
     if not db_initialized:
-        return
+        return []
         
     try:
         conn = sqlite3.connect('market_data.db')
         c = conn.cursor()
         today = datetime.now(thai_tz).strftime("%Y-%m-%d")
         
+        fresh = []
         for alert in alerts:
-            c.execute('''INSERT INTO important_news (date, category, title, link)
-                         VALUES (?, ?, ?, ?)''', 
-                      (today, alert['category'], alert['title'], alert['link']))
+            c.execute('''INSERT OR IGNORE INTO alert_seen (rule_id, guid) VALUES (?, ?)''',
+                      (alert['rule_id'], alert['guid']))
+            if c.rowcount == 0:
+                continue
+            c.execute('''INSERT INTO important_news (date, category, title, link, rule_id, summary, sentiment)
+                         VALUES (?, ?, ?, ?, ?, ?, ?)''', 
+                      (today, alert['category'], alert['title'], alert['link'],
+                       alert['rule_id'], alert['summary'], alert['sentiment']))
+            fresh.append(alert)
         
         conn.commit()
         conn.close()
+        return fresh
     except Exception as e:
         st.error(f"Error saving important news: {str(e)}")
+        return []
+
+def get_recent_alerts(limit=3):
+    """ดึงการแจ้งเตือนล่าสุดจากคิว"""
+    if not db_initialized:
+        return []
+    
+    try:
+        conn = sqlite3.connect('market_data.db')
+        c = conn.cursor()
+        c.execute('''SELECT category, title, link, summary FROM important_news
+                     ORDER BY id DESC LIMIT ?''', (limit,))
+        rows = c.fetchall()
+        conn.close()
+        return [{'category': category, 'title': title, 'link': link, 'summary': summary or ""}
+                for category, title, link, summary in rows]
+    except Exception:
+        return []
 
 # ---------- 3. วิเคราะห์ทางเทคนิค (Fallback ถ้าไม่มี yfinance) ----------
-def get_technical_analysis(symbol):
-    """วิเคราะห์ทางเทคนิคร่วมกับ sentiment"""
+def get_technical_analysis(symbol, deadline=None):
+    """วิเคราะห์ทางเทคนิคร่วมกับ sentiment (ถ้า upstream ไม่ตอบใช้ผลล่าสุดที่บันทึกไว้)"""
     if not HAS_YFINANCE:
         # Fallback technical analysis
         return {
@@ -218,19 +304,18 @@ def get_technical_analysis(symbol):
         }
     
     try:
-        ticker = yf.Ticker(symbol)
-        data = ticker.history(period="2mo")
+        data = fetch_price_history(symbol, period="2mo", timeout=upstream_timeout(deadline))
         
         if len(data) < 20:
-            return None
+            return load_last_known_good(f'technical:{symbol}')
             
         # คำนวณค่าเฉลี่ยเคลื่อนที่
         data['MA20'] = data['Close'].rolling(20).mean()
         data['MA50'] = data['Close'].rolling(50).mean()
         
-        current_price = data['Close'][-1]
-        ma20 = data['MA20'][-1]
-        ma50 = data['MA50'][-1]
+        current_price = data['Close'].iloc[-1]
+        ma20 = data['MA20'].iloc[-1]
+        ma50 = data['MA50'].iloc[-1]
         
         # คำนวณ RSI
         delta = data['Close'].diff()
@@ -238,7 +323,7 @@ def get_technical_analysis(symbol):
         loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
         rs = gain / loss
         rsi = 100 - (100 / (1 + rs))
-        current_rsi = rsi[-1] if not rsi.empty else 50
+        current_rsi = rsi.iloc[-1] if not rsi.empty else 50
         
         # วิเคราะห์แนวโน้ม
         if current_price > ma20 > ma50:
@@ -265,44 +350,114 @@ def get_technical_analysis(symbol):
             rsi_signal = " neutral"
             rsi_color = "🟡"
             
-        return {
-            'current_price': current_price,
+        result = {
+            'current_price': float(current_price),
             'trend': trend,
             'trend_color': trend_color,
-            'ma20': ma20,
-            'ma50': ma50,
-            'rsi': current_rsi,
+            'ma20': float(ma20),
+            'ma50': float(ma50),
+            'rsi': float(current_rsi),
             'rsi_signal': rsi_signal,
             'rsi_color': rsi_color,
-            'support': data['Close'].tail(20).min(),
-            'resistance': data['Close'].tail(20).max()
+            'support': float(data['Close'].tail(20).min()),
+            'resistance': float(data['Close'].tail(20).max())
         }
+        save_last_known_good(f'technical:{symbol}', result)
+        return result
     except Exception as e:
-        st.error(f"Technical analysis error: {str(e)}")
-        return None
+        last_result = load_last_known_good(f'technical:{symbol}')
+        if last_result is None:
+            st.error(f"Technical analysis error: {str(e)}")
+        return last_result
 
 # ---------- 4. ระบบบันทึกและติดตามผล ----------
-def save_daily_analysis(results):
-    """บันทึกการวิเคราะห์รายวันเพื่อติดตามผล"""
+def save_daily_analysis(results, gold_data=None):
+    """บันทึกการวิเคราะห์รายวันและสร้าง report artifact เมื่อ snapshot ของตลาดเปลี่ยน
+
+    snapshot มีเฉพาะข้อมูลจากข่าว ไม่ขึ้นกับตัวเลือกใน sidebar (กลยุทธ์ขึ้นกับการเปิดวิเคราะห์ทางเทคนิค จึงไม่รวม)
+    """
     if not db_initialized:
         return
         
     try:
-        today = datetime.now(thai_tz).strftime("%Y-%m-%d")
+        now = datetime.now(thai_tz)
+        today = now.strftime("%Y-%m-%d")
+        snapshot = {
+            'date': today,
+            'generated_at': now.strftime('%d/%m/%Y %H:%M'),
+            'results': {asset_name: {
+                'trend': data['trend'],
+                'sentiment': round(data['sentiment'], 4),
+                'article_count': data['article_count'],
+                'effective_count': round(data.get('effective_count', data['article_count']), 2)
+            } for asset_name, data in results.items()},
+            'gold_articles': [article['guid'] for article in (gold_data or {}).get('articles', [])[:5]]
+        }
+        digest = snapshot_hash(snapshot)
         
         conn = sqlite3.connect('market_data.db')
         c = conn.cursor()
+        if get_db_meta(c, 'report_snapshot_hash') == digest:
+            # ข้อมูลเหมือน snapshot ล่าสุด: ไม่ต้องบันทึกหรือสร้างรายงานซ้ำ
+            conn.close()
+            return
         
         for asset_name, data in results.items():
             c.execute('''INSERT INTO market_analysis (date, asset, sentiment, article_count, trend)
                          VALUES (?, ?, ?, ?, ?)''', 
                       (today, asset_name, data['sentiment'], data['article_count'], data['trend']))
         
+        created_at = now.isoformat()
+        save_artifacts(c, today, 'full_report', build_full_report(snapshot), created_at)
+        set_db_meta(c, 'report_snapshot_hash', digest)
+        
         conn.commit()
         conn.close()
+        
+        # Gold Summary ต้องแปลข่าว: สร้างเบื้องหลังด้วยงบเวลาของตัวเอง ไม่ให้การ render รอ
+        # (ข่าวที่หน้าแปลไปแล้วอ่านจาก cache ของการแปล)
+        if gold_data:
+            gold_snapshot = {**gold_data, 'articles': gold_data['articles'][:5]}
+            error = run_in_background('gold_summary', save_gold_summary, gold_snapshot, today, digest, created_at)
+            if error:
+                st.warning(f"Gold summary report error: {error}")
     except Exception as e:
         st.error(f"Error saving daily analysis: {str(e)}")
 
+def save_gold_summary(gold_data, day, digest, created_at):
+    """แปลและบันทึก Gold Summary ของ snapshot digest (ข้ามถ้ามี snapshot ใหม่กว่าแล้ว)"""
+    gold_summary = generate_gold_daily_summary(gold_data, Deadline(REPORT_TRANSLATE_BUDGET))
+    if not gold_summary:
+        return
+    conn = sqlite3.connect('market_data.db')
+    try:
+        c = conn.cursor()
+        with conn:
+            if get_db_meta(c, 'report_snapshot_hash') == digest:
+                save_artifacts(c, day, 'gold_summary', {'md': gold_summary}, created_at)
+    finally:
+        conn.close()
+
+def get_report_artifact(kind, fmt):
+    """รายงานล่าสุดที่สร้างไว้แล้ว (dict ที่มี date, version, content) หรือ None"""
+    if not db_initialized:
+        return None
+    try:
+        conn = sqlite3.connect('market_data.db')
+        artifact = get_latest_artifact(conn.cursor(), kind, fmt)
+        conn.close()
+        return artifact
+    except Exception:
+        return None
+
+def export_report_archive(start_date, end_date):
+    """สร้าง zip ของรายงานรายวันในช่วงวันที่ (เขียนลง temp file ทีละรายงาน) คืน file object ของ zip"""
+    conn = sqlite3.connect('market_data.db')
+    try:
+        return export_reports_zip(conn, start_date, end_date)
+    finally:
+        conn.close()
+
 def get_analysis_history():
     """ดึงประวัติการวิเคราะห์"""
     if not db_initialized:
@@ -330,7 +485,8 @@ def generate_trading_strategies(results, technical_data, live_prices):
     
     for asset_name, data in results.items():
         sentiment = data['sentiment']
-        article_count = data['article_count']
+        # ความน่าเชื่อถือตามจำนวนข่าวที่ยังมีน้ำหนักในดัชนี (ข่าวเก่ามีผลน้อยลง)
+        article_count = data.get('effective_count', data['article_count'])
         
         # กำหนดความน่าเชื่อถือ
         if article_count < 3:
@@ -344,7 +500,7 @@ def generate_trading_strategies(results, technical_data, live_prices):
             confidence_color = "🟢"
         
         # ข้อมูลทางเทคนิค
-        tech = technical_data.get(asset_name, {})
+        tech = technical_data.get(asset_name) or {}
         current_trend = tech.get('trend', 'ไม่ทราบ')
         rsi_signal = tech.get('rsi_signal', 'ไม่ทราบ')
         
@@ -410,43 +566,235 @@ def generate_trading_strategies(results, technical_data, live_prices):
     return strategies
 
 # ---------- 7. ข้อมูลเศรษฐกิจสำคัญ ----------
-def get_economic_calendar():
-    """ดึงข้อมูลเศรษฐกิจสำคัญ"""
-    today = datetime.now(thai_tz)
-    
-    economic_events = [
-        {
-            'event': 'Fed Meeting',
-            'date': (today + timedelta(days=2)).strftime('%d/%m'),
-            'impact': 'สูงมาก',
-            'effect_on_gold': 'แข็งตัวหากดอกเบี้ยไม่ขึ้น',
-            'time': '02:00 น. (ไทย)'
-        },
-        {
-            'event': 'CPI Data', 
-            'date': (today + timedelta(days=5)).strftime('%d/%m'),
-            'impact': 'สูง',
-            'effect_on_gold': 'แข็งตัวหากเงินเฟ้อสูงกว่าคาด',
-            'time': '19:30 น. (ไทย)'
-        },
-        {
-            'event': 'NFP Report',
-            'date': (today + timedelta(days=7)).strftime('%d/%m'), 
-            'impact': 'สูงมาก',
-            'effect_on_gold': 'อ่อนตัวหากจ้างงานดีกว่าคาด',
-            'time': '19:30 น. (ไทย)'
-        },
-        {
-            'event': 'Retail Sales',
-            'date': (today + timedelta(days=3)).strftime('%d/%m'),
-            'impact': 'ปานกลาง',
-            'effect_on_gold': 'แข็งตัวหากยอดขายต่ำกว่าคาด',
-            'time': '19:30 น. (ไทย)'
-        }
-    ]
+ECONOMIC_CALENDAR_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'economic_calendar.csv')
+
+# สินทรัพย์ที่วัดผลกระทบของเหตุการณ์ และช่วงเวลาที่วัด (จำนวนวันหลังวันที่ประกาศ)
+EVENT_IMPACT_ASSETS = {
+    "ทองคำ (XAU)": "GC=F",
+    "เงิน (XAG)": "SI=F",
+    "บิตคอยน์ (BTC)": "BTC-USD"
+}
+EVENT_WINDOWS = {
+    '1d': 0,
+    '3d': 2
+}
+DAILY_HISTORY_PERIOD = "5y"
+# แท่งรายวันของตลาดจาก yfinance เก็บแยกจากแท่ง '1d' ที่ rollup จากราคาที่สุ่มเก็บตอนเปิดหน้า
+# เพื่อไม่ให้สองแหล่งเขียนทับกันในวันล่าสุด
+DAILY_HISTORY_RESOLUTION = '1d_history'
+DAILY_SYNC_RETRY = 600  # วินาทีก่อนเริ่ม sync แท่งรายวันเบื้องหลังรอบถัดไป (รวมถึงเมื่อรอบก่อนล้มเหลว)
+
+def load_economic_calendar():
+    """โหลดปฏิทินเศรษฐกิจจากไฟล์ CSV ลงตาราง economic_events (เฉพาะเมื่อไฟล์เปลี่ยน) คืน True ถ้าโหลดใหม่"""
+    if not db_initialized or not os.path.exists(ECONOMIC_CALENDAR_FILE):
+        return False
+    
+    try:
+        mtime = str(os.path.getmtime(ECONOMIC_CALENDAR_FILE))
+        conn = sqlite3.connect('market_data.db')
+        c = conn.cursor()
+        if get_db_meta(c, 'economic_calendar_mtime') == mtime:
+            conn.close()
+            return False
+        
+        calendar = pd.read_csv(ECONOMIC_CALENDAR_FILE, dtype=str)
+        events = []
+        for row in calendar.itertuples(index=False):
+            local = pytz.timezone(row.timezone).localize(datetime.strptime(f"{row.date} {row.time}", "%Y-%m-%d %H:%M"))
+            events.append((row.event_type, row.event, int(local.timestamp()), row.impact))
+        
+        c.execute('DELETE FROM economic_events')
+        c.executemany('''INSERT OR REPLACE INTO economic_events (event_type, event, event_ts, impact)
+                         VALUES (?, ?, ?, ?)''', events)
+        set_db_meta(c, 'economic_calendar_mtime', mtime)
+        conn.commit()
+        conn.close()
+        return True
+    except Exception as e:
+        st.error(f"Economic calendar load error: {str(e)}")
+        return False
+
+def sync_daily_bars():
+    """เติมแท่งรายวันย้อนหลังจาก yfinance ลง price_bars (วันละครั้ง) คืน True ถ้ามีการอัปเดต
+
+    ใช้เวลารอ upstream นาน จึงรันใน thread เบื้องหลัง (sync_event_history) ไม่ใช่ใน render
+    """
+    if not HAS_YFINANCE or not db_initialized:
+        return False
+    
+    today = datetime.now(thai_tz).strftime("%Y-%m-%d")
+    conn = sqlite3.connect('market_data.db')
+    try:
+        c = conn.cursor()
+        if get_db_meta(c, 'daily_history_synced') == today:
+            return False
+        
+        today_start = int(time.time() // 86400) * 86400
+        bars = []
+        # สินทรัพย์ที่วัดผลกระทบของเหตุการณ์ และทุก symbol สำหรับ correlation ข้ามสินทรัพย์
+        for symbol in sorted(set(EVENT_IMPACT_ASSETS.values()) | set(SYMBOLS.values())):
+            data = fetch_price_history(symbol, period=DAILY_HISTORY_PERIOD, interval="1d", ttl=86400, timeout=60)
+            if data.empty:
+                continue
+            # bucket ของแท่งรายวันคือเที่ยงคืน UTC ของวันซื้อขาย (เหมือน rollup '1d')
+            days = pd.to_datetime(pd.Index(data.index.date))
+            bucket_start = (days - pd.Timestamp(0)) // pd.Timedelta(seconds=1)
+            bars.extend((symbol, DAILY_HISTORY_RESOLUTION, int(ts), float(o), float(h), float(l), float(cl))
+                        for ts, o, h, l, cl in zip(bucket_start, data['Open'], data['High'], data['Low'], data['Close'])
+                        if ts < today_start)
+        
+        # ดึงครบทุก symbol ก่อนแล้วจึงเขียน: ไม่ถือ write lock ของ database ระหว่างรอ upstream
+        with conn:
+            if history_rewritten(c, bars):
+                # แก้หรือเติมแท่งที่เคยมีแล้ว: ผู้ที่สะสมผลจากแท่งเดิม (CrossAssetMonitor) ต้องคำนวณใหม่
+                set_db_meta(c, 'daily_history_revision', int(get_db_meta(c, 'daily_history_revision', 0)) + 1)
+            c.executemany('''INSERT OR REPLACE INTO price_bars
+                             (symbol, resolution, bucket_start, open, high, low, close, samples)
+                             VALUES (?, ?, ?, ?, ?, ?, ?, 1)''', bars)
+            set_db_meta(c, 'daily_history_synced', today)
+        return True
+    finally:
+        conn.close()
+
+def history_rewritten(c, bars):
+    """True ถ้า bars เปลี่ยนราคาของแท่งรายวันที่เก็บไว้แล้ว หรือเติมวันก่อนแท่งล่าสุดของ symbol นั้น
+    (แท่งที่ต่อท้ายแท่งล่าสุดไม่นับ)"""
+    c.execute('SELECT symbol, bucket_start, open, high, low, close FROM price_bars WHERE resolution = ?',
+              (DAILY_HISTORY_RESOLUTION,))
+    stored = {(symbol, bucket_start): prices for symbol, bucket_start, *prices in c.fetchall()}
+    latest = {}
+    for symbol, bucket_start in stored:
+        latest[symbol] = max(latest.get(symbol, bucket_start), bucket_start)
+    for symbol, _, bucket_start, *prices in bars:
+        previous = stored.get((symbol, bucket_start))
+        if previous is None:
+            if symbol in latest and bucket_start < latest[symbol]:
+                return True
+        elif not all(math.isclose(a, b, rel_tol=1e-9) for a, b in zip(previous, prices)):
+            return True
+    return False
+
+def compute_event_impact():
+    """คำนวณผลตอบแทนเฉลี่ยและส่วนเบี่ยงเบนรอบเหตุการณ์แต่ละประเภท จากแท่งรายวันใน database"""
+    if not db_initialized:
+        return
+    
+    try:
+        conn = sqlite3.connect('market_data.db')
+        c = conn.cursor()
+        placeholders = ",".join("?" * len(EVENT_IMPACT_ASSETS))
+        bars = pd.read_sql_query(
+            f'''SELECT symbol, bucket_start, close FROM price_bars
+                WHERE resolution = ? AND symbol IN ({placeholders})''',
+            conn, params=[DAILY_HISTORY_RESOLUTION] + list(EVENT_IMPACT_ASSETS.values()))
+        events = pd.read_sql_query(
+            'SELECT event_type, event_ts FROM economic_events WHERE event_ts < ?',
+            conn, params=(int(time.time()),))
+        
+        impact_rows = []
+        if not bars.empty and not events.empty:
+            # matrix ราคาปิด (วันปฏิทิน x สินทรัพย์) เติมวันหยุดด้วยราคาปิดล่าสุด
+            closes = bars.pivot_table(index='bucket_start', columns='symbol', values='close')
+            first_day, last_day = closes.index.min(), closes.index.max()
+            closes = closes.reindex(np.arange(first_day, last_day + 86400, 86400)).ffill()
+            matrix = closes.to_numpy()
+            
+            event_day = (events['event_ts'].to_numpy() // 86400) * 86400
+            pre = (event_day - first_day) // 86400 - 1
+            for window, offset in EVENT_WINDOWS.items():
+                post = pre + 1 + offset
+                valid = (pre >= 0) & (post < len(matrix))
+                returns = np.full((len(events), matrix.shape[1]), np.nan)
+                returns[valid] = (matrix[post[valid]] / matrix[pre[valid]] - 1) * 100
+                
+                frame = pd.DataFrame(returns, columns=closes.columns)
+                frame['event_type'] = events['event_type'].to_numpy()
+                stats = frame.groupby('event_type').agg(['mean', 'std', 'count'])
+                for event_type in stats.index:
+                    for symbol in closes.columns:
+                        mean, std, count = stats.loc[event_type, symbol]
+                        if count > 0:
+                            impact_rows.append((event_type, symbol, window, float(mean),
+                                                float(std) if count > 1 else 0.0, int(count)))
+        
+        c.execute('DELETE FROM event_impact')
+        c.executemany('''INSERT INTO event_impact (event_type, symbol, window, mean_return, std_return, samples)
+                         VALUES (?, ?, ?, ?, ?, ?)''', impact_rows)
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        st.error(f"Event impact calculation error: {str(e)}")
+
+def sync_event_history():
+    """sync แท่งรายวัน (งานเบื้องหลัง) แล้วคำนวณผลกระทบย้อนหลังใหม่ถ้ามีแท่งใหม่"""
+    if sync_daily_bars():
+        compute_event_impact()
+
+def refresh_event_index():
+    """อัปเดตปฏิทินและผลกระทบย้อนหลังเมื่อไฟล์ปฏิทินเปลี่ยน (แท่งรายวันใหม่อัปเดตใน sync_event_history)"""
+    if load_economic_calendar():
+        compute_event_impact()
+
+def get_economic_calendar(start=None, end=None):
+    """ดึงเหตุการณ์เศรษฐกิจในช่วงวันที่ พร้อมผลกระทบต่อราคาที่วัดได้ในอดีต"""
+    if not db_initialized:
+        return []
+    
+    start = start or datetime.now(thai_tz)
+    end = end or start + timedelta(days=14)
+    
+    try:
+        conn = sqlite3.connect('market_data.db')
+        c = conn.cursor()
+        c.execute('''SELECT event_type, event, event_ts, impact FROM economic_events
+                     WHERE event_ts BETWEEN ? AND ? ORDER BY event_ts''',
+                  (int(start.timestamp()), int(end.timestamp())))
+        rows = c.fetchall()
+        
+        c.execute('SELECT event_type, symbol, window, mean_return, std_return, samples FROM event_impact')
+        impact = {}
+        for event_type, symbol, window, mean_return, std_return, samples in c.fetchall():
+            impact.setdefault(event_type, {}).setdefault(symbol, {})[window] = {
+                'mean': mean_return, 'std': std_return, 'samples': samples
+            }
+        conn.close()
+    except Exception as e:
+        st.error(f"Economic calendar error: {str(e)}")
+        return []
+    
+    economic_events = []
+    for event_type, event, event_ts, event_impact in rows:
+        event_time = datetime.fromtimestamp(event_ts, thai_tz)
+        reactions = {}
+        for asset_name, symbol in EVENT_IMPACT_ASSETS.items():
+            measured = impact.get(event_type, {}).get(symbol)
+            if measured:
+                reactions[asset_name] = measured
+        economic_events.append({
+            'event': event,
+            'event_type': event_type,
+            'date': event_time.strftime('%d/%m'),
+            'impact': event_impact,
+            'time': event_time.strftime('%H:%M น. (ไทย)'),
+            'reactions': reactions
+        })
     
     return economic_events
 
+def get_unscheduled_event_types(until):
+    """ประเภทเหตุการณ์ที่ไฟล์ปฏิทินไม่มีกำหนดการถึงเวลา until (เช่นยังไม่ได้เพิ่มตารางปีใหม่)"""
+    if not db_initialized:
+        return []
+    try:
+        conn = sqlite3.connect('market_data.db')
+        c = conn.cursor()
+        c.execute('SELECT event_type, MAX(event_ts) FROM economic_events GROUP BY event_type')
+        rows = c.fetchall()
+        conn.close()
+    except Exception:
+        return []
+    return sorted(event_type for event_type, last_ts in rows if last_ts < until.timestamp())
+
 # ---------- 8. Dashboard ประสิทธิภาพการทำนาย ----------
 def get_performance_stats():
     """แสดงประสิทธิภาพการทำนายย้อนหลัง"""
@@ -511,61 +859,781 @@ class NewsUpdater:
         time_diff = datetime.now() - self.last_update
         return time_diff.total_seconds() > 3600  # อัปเดตทุก 1 ชั่วโมง
 
+# ---------- 12. Rollup และ Retention ของข้อมูลราคา ----------
+# ความละเอียดของแท่ง OHLC (วินาที) เรียงจากละเอียดไปหยาบ
+PRICE_RESOLUTIONS = {
+    '1m': 60,
+    '1h': 3600,
+    '1d': 86400
+}
+
+# อายุการเก็บข้อมูลของแต่ละระดับ (วินาที), None = เก็บตลอดไป
+PRICE_RETENTION = {
+    'raw': 2 * 86400,
+    '1m': 7 * 86400,
+    '1h': 180 * 86400,
+    '1d': None
+}
+
+COMPACTION_INTERVAL = 900  # รัน compaction อย่างมากทุก 15 นาที
+VACUUM_PAGES = 500  # จำนวนหน้าที่คืนพื้นที่ต่อรอบ
+
+def _aggregate_bars(df, width):
+    """รวมแถวราคา (เรียงตามเวลา) เป็นแท่ง OHLC ตามความกว้าง bucket"""
+    df = df.assign(bucket_start=(df['ts'] // width) * width)
+    bars = df.groupby(['symbol', 'bucket_start'], sort=False).agg(
+        open=('open', 'first'),
+        high=('high', 'max'),
+        low=('low', 'min'),
+        close=('close', 'last'),
+        samples=('samples', 'sum')
+    ).reset_index()
+    return bars
+
+def _load_rollup_source(conn, source, start_ts, end_ts):
+    """โหลดข้อมูลต้นทางของ rollup ในช่วง [start_ts, end_ts)"""
+    if source == 'raw':
+        df = pd.read_sql_query(
+            '''SELECT symbol, price, timestamp FROM price_data
+               WHERE timestamp >= ? AND timestamp < ? ORDER BY timestamp''',
+            conn,
+            params=(datetime.fromtimestamp(start_ts, thai_tz).isoformat(),
+                    datetime.fromtimestamp(end_ts, thai_tz).isoformat()))
+        if df.empty:
+            return df
+        ts = pd.to_datetime(df['timestamp'], utc=True, format='ISO8601')
+        return pd.DataFrame({
+            'symbol': df['symbol'],
+            'ts': (ts - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1),
+            'open': df['price'], 'high': df['price'], 'low': df['price'], 'close': df['price'],
+            'samples': 1
+        })
+
+    return pd.read_sql_query(
+        '''SELECT symbol, bucket_start AS ts, open, high, low, close, samples
+           FROM price_bars WHERE resolution = ? AND bucket_start >= ? AND bucket_start < ?
+           ORDER BY bucket_start''',
+        conn, params=(source, start_ts, end_ts))
+
+def compact_price_data(force=False):
+    """Rollup price_data เป็นแท่ง 1m/1h/1d, ลบข้อมูลที่หมดอายุ และคืนพื้นที่แบบ incremental"""
+    if not db_initialized:
+        return
+
+    try:
+        now = int(time.time())
+        conn = sqlite3.connect('market_data.db')
+        c = conn.cursor()
+
+        last_run = float(get_db_meta(c, 'price_compaction_last_run', 0))
+        if not force and now - last_run < COMPACTION_INTERVAL:
+            conn.close()
+            return
+
+        # rollup เฉพาะ bucket ที่ปิดแล้วตั้งแต่ watermark ล่าสุด ระดับถัดไปใช้ผลของระดับก่อนหน้า
+        source = 'raw'
+        for resolution, width in PRICE_RESOLUTIONS.items():
+            watermark = int(get_db_meta(c, f'price_rollup_{resolution}', 0))
+            end_ts = (now // width) * width
+            if end_ts > watermark:
+                df = _load_rollup_source(conn, source, watermark, end_ts)
+                if not df.empty:
+                    bars = _aggregate_bars(df, width)
+                    c.executemany('''INSERT OR REPLACE INTO price_bars
+                                     (symbol, resolution, bucket_start, open, high, low, close, samples)
+                                     VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                                  [(row.symbol, resolution, int(row.bucket_start), float(row.open),
+                                    float(row.high), float(row.low), float(row.close), int(row.samples))
+                                   for row in bars.itertuples(index=False)])
+                set_db_meta(c, f'price_rollup_{resolution}', end_ts)
+            source = resolution
+
+        # ลบข้อมูลที่เกินอายุการเก็บ (หลัง rollup เสมอ เพื่อไม่ให้ข้อมูลหายก่อนถูกรวม)
+        raw_keep = PRICE_RETENTION.get('raw')
+        if raw_keep is not None:
+            cutoff = datetime.fromtimestamp(now - raw_keep, thai_tz).isoformat()
+            c.execute('DELETE FROM price_data WHERE timestamp < ?', (cutoff,))
+        for resolution in PRICE_RESOLUTIONS:
+            keep = PRICE_RETENTION.get(resolution)
+            if keep is not None:
+                c.execute('DELETE FROM price_bars WHERE resolution = ? AND bucket_start < ?',
+                          (resolution, now - keep))
+
+        set_db_meta(c, 'price_compaction_last_run', now)
+        conn.commit()
+
+        c.execute(f'PRAGMA incremental_vacuum({VACUUM_PAGES})')
+        c.fetchall()
+        conn.close()
+    except Exception as e:
+        st.error(f"Price compaction error: {str(e)}")
+
+def choose_price_resolution(start_ts, end_ts, max_points=500):
+    """เลือกความละเอียดที่ยังมีข้อมูลครอบคลุมช่วงเวลาและจำนวนแท่งไม่เกิน max_points"""
+    now = time.time()
+    for resolution, width in PRICE_RESOLUTIONS.items():
+        keep = PRICE_RETENTION.get(resolution)
+        covers = keep is None or start_ts >= now - keep
+        if covers and (end_ts - start_ts) / width <= max_points:
+            return resolution
+    return list(PRICE_RESOLUTIONS)[-1]
+
+def get_price_history(symbol, start, end=None, max_points=500):
+    """ดึงประวัติราคาแบบแท่ง OHLC โดยเลือกความละเอียดให้เหมาะกับช่วงเวลาอัตโนมัติ"""
+    if not db_initialized:
+        return pd.DataFrame()
+
+    end = end or datetime.now(thai_tz)
+    start_ts, end_ts = int(start.timestamp()), int(end.timestamp())
+    resolution = choose_price_resolution(start_ts, end_ts, max_points)
+
+    try:
+        conn = sqlite3.connect('market_data.db')
+        df = pd.read_sql_query(
+            '''SELECT bucket_start, open, high, low, close, samples FROM price_bars
+               WHERE symbol = ? AND resolution = ? AND bucket_start BETWEEN ? AND ?
+               ORDER BY bucket_start''',
+            conn, params=(symbol, resolution, start_ts, end_ts))
+        conn.close()
+
+        df['time'] = pd.to_datetime(df['bucket_start'], unit='s', utc=True).dt.tz_convert(thai_tz)
+        df.attrs['resolution'] = resolution
+        return df
+    except Exception:
+        return pd.DataFrame()
+
+# ---------- 13. ดัชนี sentiment แบบ time decay ----------
+SENTIMENT_HALF_LIFE = 12 * 3600  # ครึ่งชีวิตของน้ำหนักข่าว (วินาที)
+
+class SentimentIndex:
+    """ดัชนี sentiment ต่อสินทรัพย์ ถ่วงน้ำหนักแบบ exponential decay ตามเวลาเผยแพร่ (อัปเดต O(1) ต่อข่าว)"""
+    def __init__(self, half_life=SENTIMENT_HALF_LIFE):
+        self.decay_rate = math.log(2) / half_life
+        self.state = {asset_name: {'value_sum': 0.0, 'weight_sum': 0.0, 'ref_ts': None} for asset_name in ASSETS}
+        self.last_article_id = 0
+        
+    def add(self, asset_name, score, published_ts):
+        """เพิ่มคะแนนข่าวหนึ่งข่าว: decay ผลรวมเดิมไปยังเวลาใหม่ หรือ decay ข่าวที่เก่ากว่าเวลาอ้างอิง"""
+        state = self.state.get(asset_name)
+        if state is None:
+            return
+        if state['ref_ts'] is None:
+            state['value_sum'], state['weight_sum'], state['ref_ts'] = score, 1.0, published_ts
+        elif published_ts >= state['ref_ts']:
+            factor = math.exp(-self.decay_rate * (published_ts - state['ref_ts']))
+            state['value_sum'] = state['value_sum'] * factor + score
+            state['weight_sum'] = state['weight_sum'] * factor + 1.0
+            state['ref_ts'] = published_ts
+        else:
+            factor = math.exp(-self.decay_rate * (state['ref_ts'] - published_ts))
+            state['value_sum'] += score * factor
+            state['weight_sum'] += factor
+    
+    def value(self, asset_name):
+        """ค่าดัชนี (ค่าเฉลี่ยถ่วงน้ำหนัก) หรือ None ถ้ายังไม่มีข่าว"""
+        state = self.state[asset_name]
+        if state['weight_sum'] <= 0:
+            return None
+        return state['value_sum'] / state['weight_sum']
+    
+    def weight(self, asset_name, now=None):
+        """จำนวนข่าวที่มีผล ณ เวลาปัจจุบัน (ผลรวมน้ำหนักหลัง decay)"""
+        state = self.state[asset_name]
+        if state['ref_ts'] is None:
+            return 0.0
+        now = now or time.time()
+        return state['weight_sum'] * math.exp(-self.decay_rate * max(0.0, now - state['ref_ts']))
+    
+    def load(self, c):
+        """โหลดสถานะจาก checkpoint ใน database"""
+        c.execute('SELECT asset, value_sum, weight_sum, ref_ts, last_article_id FROM sentiment_index')
+        for asset_name, value_sum, weight_sum, ref_ts, last_article_id in c.fetchall():
+            if asset_name in self.state:
+                self.state[asset_name] = {'value_sum': value_sum, 'weight_sum': weight_sum, 'ref_ts': ref_ts}
+                self.last_article_id = max(self.last_article_id, last_article_id or 0)
+    
+    def checkpoint(self, c):
+        """บันทึกสถานะลง database"""
+        now = datetime.now(thai_tz).isoformat()
+        c.executemany('''INSERT OR REPLACE INTO sentiment_index
+                         (asset, value_sum, weight_sum, ref_ts, last_article_id, updated_at)
+                         VALUES (?, ?, ?, ?, ?, ?)''',
+                      [(asset_name, state['value_sum'], state['weight_sum'], state['ref_ts'],
+                        self.last_article_id, now)
+                       for asset_name, state in self.state.items()])
+
+# ---------- 14. ประมวลผลข่าวแบบ delta ----------
+RECENT_ARTICLE_WINDOW = 30  # จำนวนข่าวล่าสุดต่อสินทรัพย์ที่ใช้คำนวณ (เท่ากับ 10 ข่าว x 3 feed เดิม)
+DELTA_LIMIT = 1000  # จำนวนข่าวใหม่สูงสุดที่โหลดต่อรอบ
+
+def _article_from_row(row):
+    """แปลงแถวจาก news_articles เป็น article dict"""
+    article_id, guid, feed, title, link, summary, published, published_ts, assets, sentiment = row
+    return {
+        "id": article_id,
+        "guid": guid,
+        "feed": feed,
+        "title": title,
+        "link": link,
+        "summary_en": summary,
+        "published": published,
+        "published_ts": published_ts,
+        "content_lower": (title + " " + summary).lower(),
+        "assets": json.loads(assets) if assets else [],
+        "sentiment": sentiment
+    }
+
+class NewsAggregator:
+    """สถานะรวมของข่าวต่อสินทรัพย์ ที่อัปเดตแบบ incremental จากข่าวใหม่ (delta)"""
+    def __init__(self, window=RECENT_ARTICLE_WINDOW):
+        self.window = window
+        self.last_article_id = 0
+        self.recent = deque(maxlen=window)
+        self.assets = {asset_name: deque(maxlen=window) for asset_name in ASSETS}
+        self.index = SentimentIndex()
+        self.seen = OrderedDict()
+        self.lock = threading.Lock()
+        
+        if db_initialized:
+            try:
+                conn = sqlite3.connect('market_data.db')
+                self.index.load(conn.cursor())
+                conn.close()
+            except Exception as e:
+                st.error(f"Error loading sentiment index: {str(e)}")
+        
+    def apply(self, delta):
+        """เพิ่มข่าวใหม่เข้า window ของแต่ละสินทรัพย์และดัชนี sentiment แบบ O(delta)"""
+        applied = []
+        now = time.time()
+        for article in delta:
+            if article['guid'] in self.seen:
+                continue
+            self.seen[article['guid']] = None
+            if len(self.seen) > DELTA_LIMIT:
+                self.seen.popitem(last=False)
+            
+            self.recent.append(article)
+            # ข่าวที่ดัชนีนับไปแล้วก่อน restart (id <= checkpoint) จะไม่ถูกนับซ้ำ
+            index_new = article.get('id') is None or article['id'] > self.index.last_article_id
+            for asset_name in article['assets']:
+                if asset_name not in self.assets:
+                    continue
+                self.assets[asset_name].append(article)
+                if index_new:
+                    self.index.add(asset_name, article['sentiment'], article.get('published_ts') or now)
+            if index_new and article.get('id'):
+                self.index.last_article_id = article['id']
+            applied.append(article)
+        return applied
+    
+    def update(self, fetched=None):
+        """โหลดข่าวที่เพิ่มใน database หลังรอบก่อน (หรือใช้ข่าวที่ดึงมาถ้าไม่มี database)"""
+        with self.lock:
+            if not db_initialized:
+                return self.apply(fetched or [])
+            
+            try:
+                conn = sqlite3.connect('market_data.db')
+                c = conn.cursor()
+                placeholders = ",".join("?" * len(RSS_FEEDS))
+                c.execute(f'''SELECT id, guid, feed, title, link, summary, published, published_ts, assets, sentiment
+                              FROM news_articles WHERE id > ? AND feed IN ({placeholders})
+                              ORDER BY id DESC LIMIT ?''',
+                          (self.last_article_id, *RSS_FEEDS, DELTA_LIMIT))
+                rows = c.fetchall()
+                conn.close()
+            except Exception as e:
+                st.error(f"Error loading news delta: {str(e)}")
+                return []
+            
+            if not rows:
+                return []
+            
+            self.last_article_id = rows[0][0]
+            applied = self.apply([_article_from_row(row) for row in reversed(rows)])
+            try:
+                conn = sqlite3.connect('market_data.db')
+                self.index.checkpoint(conn.cursor())
+                conn.commit()
+                conn.close()
+            except Exception as e:
+                st.error(f"Error saving sentiment index: {str(e)}")
+            return applied
+    
+    def recent_articles(self):
+        """ข่าวล่าสุดทั้งหมด (ใหม่สุดก่อน)"""
+        return list(reversed(self.recent))
+    
+    def asset_summary(self, asset_name):
+        """ดัชนี sentiment และข่าวล่าสุดของสินทรัพย์จากสถานะที่สะสมไว้"""
+        articles = self.assets[asset_name]
+        sentiment = self.index.value(asset_name)
+        if not articles or sentiment is None:
+            return None
+        return {
+            'articles': list(reversed(articles)),
+            'sentiment': sentiment,
+            'article_count': len(articles),
+            'effective_count': self.index.weight(asset_name)
+        }
+
+@st.cache_resource
+def get_news_aggregator():
+    """NewsAggregator หนึ่งตัวต่อ process ใช้ร่วมกันทุก session"""
+    return NewsAggregator()
+
+# ---------- 15. Cache ที่ใช้ร่วมกันระหว่าง replica ----------
+# st.cache_data ยังเป็น cache ชั้นแรกของแต่ละ process ส่วนการเรียก upstream
+# (Google News, Yahoo, Google Translate) ผ่าน shared cache ที่มี lease ต่อ key
+FEED_CACHE_TTL = 600
+PRICE_CACHE_TTL = 60
+HISTORY_CACHE_TTL = 3600
+TRANSLATION_CACHE_TTL = 7 * 86400
+
+@st.cache_resource
+def get_shared_cache():
+    """SharedCache หนึ่งตัวต่อ process (backend ตาม SMARTMARKET_CACHE_URL)"""
+    return SharedCache(create_backend())
+
+def fetch_feed_entries(url):
+    """ดึง entry ของ RSS feed โดยให้ replica ที่ถือ lease เป็นผู้เรียก Google News"""
+    cache = get_shared_cache()
+    key = f'feed:{url}'
+
+    def fetch():
+        # conditional GET: feed ที่ไม่เปลี่ยนจะได้ 304 และใช้ entry ชุดเดิมใน cache
+        previous = cache.peek(key)
+        etag = previous.get('etag') if previous else None
+        modified = previous.get('modified') if previous else None
+        feed = feedparser.parse(url, etag=etag, modified=modified)
+        if feed.get('status') == 304 and previous:
+            return previous
+        return {
+            'etag': feed.get('etag'),
+            'modified': feed.get('modified'),
+            'entries': [{
+                'id': entry.get('id'),
+                'title': entry.get('title', ''),
+                'link': entry.get('link', ''),
+                'summary': entry.get('summary', ''),
+                'published': entry.get('published', '')
+            } for entry in feed.entries[:10]]
+        }
+
+    return cache.get_or_compute(key, FEED_CACHE_TTL, fetch)['entries']
+
+def fetch_price_history(symbol, period, interval="1d", ttl=HISTORY_CACHE_TTL, timeout=None):
+    """ดึงประวัติราคาจาก yfinance ผ่าน shared cache คืน DataFrame แบบเดียวกับ Ticker.history"""
+    timeout = UPSTREAM_TIMEOUT if timeout is None else timeout
+    def fetch():
+        breaker = get_circuit_breakers()['yahoo']
+        data = breaker.call(lambda: yf.Ticker(symbol).history(period=period, interval=interval), timeout)
+        return {
+            'tz': str(data.index.tz) if getattr(data.index, 'tz', None) else None,
+            'index': [ts.isoformat() for ts in data.index],
+            'columns': {col: data[col].astype(float).tolist()
+                        for col in ('Open', 'High', 'Low', 'Close', 'Volume') if col in data}
+        }
+
+    payload = get_shared_cache().get_or_compute(f'history:{symbol}:{period}:{interval}', ttl, fetch,
+                                                wait_timeout=timeout)
+    index = pd.to_datetime(payload['index'], utc=True)
+    if payload['tz']:
+        index = index.tz_convert(payload['tz'])
+    return pd.DataFrame(payload['columns'], index=pd.DatetimeIndex(index, name='Date'))
+
+# ---------- 16. งบเวลา, circuit breaker และค่า last-known-good ----------
+RENDER_BUDGET = 10.0  # วินาทีต่อการ render หนึ่งครั้ง สำหรับการเรียก upstream ทั้งหมด
+RENDER_STAGES = {'prices': 3, 'technical': 3, 'translate': 4}
+UPSTREAM_TIMEOUT = 5.0  # เวลาสูงสุดต่อการเรียก upstream หนึ่งครั้ง
+REPORT_TRANSLATE_BUDGET = 10.0  # งบเวลาแปล Gold Summary ที่บันทึกเป็นรายงาน (งานเบื้องหลัง ไม่นับในงบของ render)
+BACKGROUND_WORKERS = 2
+
+@st.cache_resource
+def get_circuit_breakers():
+    """circuit breaker หนึ่งตัวต่อ upstream ใช้ร่วมกันทุก session ใน process"""
+    return {
+        'yahoo': CircuitBreaker('yahoo', timeout=UPSTREAM_TIMEOUT),
+        'translate': CircuitBreaker('translate', timeout=UPSTREAM_TIMEOUT)
+    }
+
+def upstream_timeout(deadline):
+    """เวลาที่รอ upstream ได้ในการเรียกครั้งนี้ (ไม่เกินเวลาที่เหลือของ stage)"""
+    if deadline is None:
+        return UPSTREAM_TIMEOUT
+    return min(UPSTREAM_TIMEOUT, deadline.remaining())
+
+@st.cache_resource
+def get_background_jobs():
+    """thread เบื้องหลังสำหรับงานที่รอ upstream นานเกินงบของการ render ใช้ร่วมกันทุก session ใน process"""
+    return {
+        'executor': ThreadPoolExecutor(max_workers=BACKGROUND_WORKERS, thread_name_prefix='background'),
+        'lock': threading.Lock(),
+        'pending': {},
+        'started': {},
+        'errors': {}
+    }
+
+def _run_background(jobs, name, fn, args):
+    try:
+        fn(*args)
+        jobs['errors'].pop(name, None)
+    except Exception as e:
+        jobs['errors'][name] = str(e)
+
+def run_in_background(name, fn, *args, retry_after=None):
+    """ส่ง fn(*args) ไปรันใน thread เบื้องหลังโดยไม่รอผล คืนข้อความ error ของงาน name รอบล่าสุด (หรือ None)
+
+    retry_after: ไม่ส่งงาน name ซ้ำถ้ายังรันอยู่หรือเพิ่งส่งไปไม่ถึง retry_after วินาที (None = ส่งทุกครั้ง)
+    """
+    jobs = get_background_jobs()
+    with jobs['lock']:
+        if retry_after is not None:
+            pending = jobs['pending'].get(name)
+            if (pending and not pending.done()) or time.time() - jobs['started'].get(name, 0) < retry_after:
+                return jobs['errors'].get(name)
+        jobs['started'][name] = time.time()
+        jobs['pending'][name] = jobs['executor'].submit(_run_background, jobs, name, fn, args)
+        return jobs['errors'].get(name)
+
+def save_last_known_good(key, value):
+    """บันทึกผลล่าสุดที่สำเร็จไว้ใช้เมื่อ upstream ล้มเหลว"""
+    if not db_initialized:
+        return
+    try:
+        conn = sqlite3.connect('market_data.db')
+        conn.execute('INSERT OR REPLACE INTO last_known_good (key, value, updated_at) VALUES (?, ?, ?)',
+                     (key, json.dumps(value, ensure_ascii=False), time.time()))
+        conn.commit()
+        conn.close()
+    except Exception as e:
+        st.error(f"Error saving last known good value: {str(e)}")
+
+def load_last_known_good(key):
+    """อ่านผลล่าสุดที่บันทึกไว้ (เพิ่ม 'as_of' เป็นเวลาที่บันทึก) หรือ None"""
+    if not db_initialized:
+        return None
+    try:
+        conn = sqlite3.connect('market_data.db')
+        row = conn.execute('SELECT value, updated_at FROM last_known_good WHERE key = ?', (key,)).fetchone()
+        conn.close()
+    except Exception:
+        return None
+    if row is None:
+        return None
+    value = json.loads(row[0])
+    value['as_of'] = row[1]
+    return value
+
+def load_last_price(symbol):
+    """ราคาล่าสุดของ symbol จาก price_data (หรือแท่งล่าสุดใน price_bars) หรือ None"""
+    if not db_initialized:
+        return None
+    try:
+        conn = sqlite3.connect('market_data.db')
+        c = conn.cursor()
+        c.execute('''SELECT price, change_percent, timestamp FROM price_data
+                     WHERE symbol = ? ORDER BY id DESC LIMIT 1''', (symbol,))
+        row = c.fetchone()
+        if row:
+            price, change, as_of = row[0], row[1], datetime.fromisoformat(row[2]).timestamp()
+        else:
+            c.execute('''SELECT close, bucket_start FROM price_bars
+                         WHERE symbol = ? ORDER BY bucket_start DESC LIMIT 1''', (symbol,))
+            row = c.fetchone()
+            if row is None:
+                conn.close()
+                return None
+            price, change, as_of = row[0], 0.0, row[1]
+        conn.close()
+    except Exception:
+        return None
+    return {'price': price, 'change': change, 'symbol': symbol, 'as_of': as_of}
+
+def format_age(as_of):
+    """แสดงอายุของข้อมูล เช่น '5 นาทีที่แล้ว'"""
+    age = max(0, time.time() - as_of)
+    if age < 60:
+        return "ไม่กี่วินาทีที่แล้ว"
+    if age < 3600:
+        return f"{int(age // 60)} นาทีที่แล้ว"
+    if age < 86400:
+        return f"{int(age // 3600)} ชั่วโมงที่แล้ว"
+    return f"{int(age // 86400)} วันที่แล้ว"
+
+# ---------- 17. ความสัมพันธ์ข้ามสินทรัพย์และความอ่อนไหวต่อดอลลาร์ ----------
+CORRELATION_WINDOW = 60  # จำนวนวันซื้อขายในหน้าต่าง rolling
+DOLLAR_ASSET = "ดอลลาร์"
+
+class RollingMoments:
+    """ผลรวม Σx และ Σxxᵀ ของหลายตัวแปรในหน้าต่าง window แถวล่าสุด (อัปเดต O(k²) ต่อแถว)"""
+    def __init__(self, n_columns, window):
+        self.window = window
+        self.buffer = np.zeros((window, n_columns))
+        self.count = 0
+        self.pos = 0
+        self.sum = np.zeros(n_columns)
+        self.outer = np.zeros((n_columns, n_columns))
+        self.updates = 0
+
+    def reset(self, rows):
+        """คำนวณผลรวมใหม่จาก rows (ใช้ window แถวสุดท้าย) ด้วย matrix operation ครั้งเดียว"""
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, self.buffer.shape[1])[-self.window:]
+        n = len(rows)
+        self.buffer[:n] = rows
+        self.count = n
+        self.pos = n % self.window
+        self.sum = rows.sum(axis=0)
+        self.outer = rows.T @ rows
+        self.updates = 0
+
+    def rows(self):
+        """แถวในหน้าต่าง เรียงจากเก่าไปใหม่"""
+        if self.count < self.window:
+            return self.buffer[:self.count].copy()
+        return np.roll(self.buffer, -self.pos, axis=0)
+
+    def push(self, row):
+        """เพิ่มแถวใหม่และนำแถวที่เก่าที่สุดออกเมื่อหน้าต่างเต็ม"""
+        row = np.asarray(row, dtype=np.float64)
+        if self.count == self.window:
+            old = self.buffer[self.pos]
+            self.sum -= old
+            self.outer -= np.outer(old, old)
+        else:
+            self.count += 1
+        self.buffer[self.pos] = row
+        self.pos = (self.pos + 1) % self.window
+        self.sum += row
+        self.outer += np.outer(row, row)
+
+        self.updates += 1
+        if self.updates >= self.window:
+            # คำนวณใหม่จาก buffer เป็นระยะ กันความคลาดเคลื่อนสะสมจากการลบ
+            self.reset(self.rows())
+
+    def extend(self, rows):
+        """เพิ่มหลายแถว (ถ้ามากกว่าหน้าต่างคำนวณใหม่ทั้งหมดแทนการ push ทีละแถว)"""
+        rows = np.asarray(rows, dtype=np.float64).reshape(-1, self.buffer.shape[1])
+        if len(rows) >= self.window:
+            self.reset(rows)
+        else:
+            for row in rows:
+                self.push(row)
+
+    def covariance(self):
+        """covariance matrix ของตัวอย่างในหน้าต่าง หรือ None ถ้ามีไม่ถึง 2 แถว"""
+        n = self.count
+        if n < 2:
+            return None
+        mean = self.sum / n
+        return (self.outer - n * np.outer(mean, mean)) / (n - 1)
+
+    def correlation(self):
+        cov = self.covariance()
+        if cov is None:
+            return None
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(std, std)
+        return np.where(np.outer(std, std) > 0, corr, np.nan)
+
+class CrossAssetMonitor:
+    """correlation และ beta แบบ rolling ของผลตอบแทนรายวัน (และ sentiment รายวัน) จากแท่งรายวันของ yfinance
+
+    แต่ละแถวคือวันซื้อขายที่ทุก symbol มีราคาปิด: log return (%) ของทุกสินทรัพย์ตามด้วย
+    sentiment เฉลี่ยของข่าวในวันนั้น (0 ถ้าไม่มีข่าว) อัปเดตเฉพาะแท่งที่ปิดแล้วและยังไม่เคยเห็น
+    """
+    def __init__(self, symbols=None, window=CORRELATION_WINDOW):
+        self.symbols = dict(symbols or SYMBOLS)
+        self.sentiment_assets = [asset_name for asset_name in self.symbols if asset_name in ASSETS]
+        self.window = window
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.moments = RollingMoments(len(self.symbols) + len(self.sentiment_assets), self.window)
+        self.last_day = None
+        self.last_close = None
+        self.revision = None
+
+    def update(self):
+        """เพิ่มแท่งรายวันที่ปิดแล้วหลังแท่งล่าสุดที่ประมวลผล คืนจำนวนวันที่เพิ่ม"""
+        if not db_initialized:
+            return 0
+        with self.lock:
+            conn = sqlite3.connect('market_data.db')
+            try:
+                c = conn.cursor()
+                revision = get_db_meta(c, 'daily_history_revision')
+                if revision != self.revision:
+                    # sync แก้หรือเติมแท่งที่เคยมีแล้ว: สร้างใหม่จากแท่งทั้งหมด
+                    # (sync ที่เพิ่มแค่วันใหม่ต่อท้ายไม่เปลี่ยน revision จึงเพิ่มทีละแท่งตามปกติ)
+                    self._reset()
+                    self.revision = revision
+
+                symbols = list(self.symbols.values())
+                placeholders = ",".join("?" * len(symbols))
+                today_start = int(time.time() // 86400) * 86400
+                bars = pd.read_sql_query(
+                    f'''SELECT symbol, bucket_start, close FROM price_bars
+                        WHERE resolution = ? AND symbol IN ({placeholders})
+                          AND bucket_start > ? AND bucket_start < ?''',
+                    conn, params=[DAILY_HISTORY_RESOLUTION] + symbols + [self.last_day if self.last_day is not None else -1, today_start])
+                if bars.empty:
+                    return 0
+
+                closes = bars.pivot_table(index='bucket_start', columns='symbol', values='close')
+                closes = closes.reindex(columns=symbols).dropna()
+                if self.last_close is not None:
+                    closes = pd.concat([pd.DataFrame([self.last_close], index=[self.last_day], columns=symbols), closes])
+                if len(closes) < 2:
+                    if self.last_close is None and len(closes):
+                        self.last_day, self.last_close = int(closes.index[-1]), closes.iloc[-1].to_numpy()
+                    return 0
+
+                returns = np.diff(np.log(closes.to_numpy()), axis=0) * 100
+                days = closes.index.to_numpy()[1:]
+                sentiment = self._daily_sentiment(conn, days)
+                self.moments.extend(np.hstack([returns, sentiment]))
+                self.last_day, self.last_close = int(days[-1]), closes.iloc[-1].to_numpy()
+                return len(days)
+            finally:
+                conn.close()
+
+    def _daily_sentiment(self, conn, days):
+        """sentiment เฉลี่ยต่อวัน (UTC) ของแต่ละสินทรัพย์ในวันที่ days (0 ถ้าไม่มีข่าว)"""
+        news = pd.read_sql_query(
+            'SELECT published_ts, assets, sentiment FROM news_articles WHERE published_ts >= ? AND published_ts < ?',
+            conn, params=(int(days.min()), int(days.max()) + 86400))
+        matrix = np.zeros((len(days), len(self.sentiment_assets)))
+        if news.empty:
+            return matrix
+        news['day'] = news['published_ts'] // 86400 * 86400
+        for col, asset_name in enumerate(self.sentiment_assets):
+            related = news[news['assets'].str.contains(json.dumps(asset_name, ensure_ascii=False), regex=False)]
+            daily = related.groupby('day')['sentiment'].mean()
+            matrix[:, col] = daily.reindex(days).fillna(0.0).to_numpy()
+        return matrix
+
+    def snapshot(self):
+        """correlation/beta เทียบดอลลาร์, correlation matrix ของผลตอบแทน และ sentiment กับผลตอบแทน"""
+        with self.lock:
+            cov = self.moments.covariance()
+            corr = self.moments.correlation()
+            count = self.moments.count
+            last_day = self.last_day
+        if cov is None or count < 10:
+            return None
+
+        names = list(self.symbols)
+        n_assets = len(names)
+        dollar = names.index(DOLLAR_ASSET) if DOLLAR_ASSET in names else None
+        dollar_sensitivity = {}
+        if dollar is not None and cov[dollar, dollar] > 0:
+            betas = cov[:n_assets, dollar] / cov[dollar, dollar]
+            for i, asset_name in enumerate(names):
+                if i != dollar:
+                    dollar_sensitivity[asset_name] = {'correlation': float(corr[i, dollar]), 'beta': float(betas[i])}
+
+        sentiment_correlation = {
+            asset_name: float(corr[n_assets + col, names.index(asset_name)])
+            for col, asset_name in enumerate(self.sentiment_assets)
+        }
+        return {
+            'days': count,
+            'as_of': last_day,
+            'dollar': dollar_sensitivity,
+            'matrix': pd.DataFrame(corr[:n_assets, :n_assets], index=names, columns=names),
+            'sentiment': sentiment_correlation
+        }
+
+@st.cache_resource
+def get_cross_asset_monitor():
+    """CrossAssetMonitor หนึ่งตัวต่อ process ใช้ร่วมกันทุก session"""
+    return CrossAssetMonitor()
+
 # ---------- ฟังก์ชันหลักที่มีอยู่เดิม ----------
 @st.cache_data(ttl=3600, show_spinner=False)
 def get_news():
-    articles = []
+    """ดึง RSS และประมวลผลเฉพาะข่าวที่ยังไม่เคยเห็น บันทึกลง news_articles แล้วคืนข่าวใหม่ (delta)"""
+    new_articles = []
+    conn = sqlite3.connect('market_data.db') if db_initialized else None
     for url in RSS_FEEDS:
         try:
-            feed = feedparser.parse(url)
-            for entry in feed.entries[:10]:
+            c = conn.cursor() if conn else None
+            entries = fetch_feed_entries(url)
+            keys = [article_key(entry.get('id'), entry.get('link'), entry.get('title')) for entry in entries]
+            seen = set()
+            if c and keys:
+                c.execute(f"SELECT guid FROM news_articles WHERE guid IN ({','.join('?' * len(keys))})", keys)
+                seen = {row[0] for row in c.fetchall()}
+            
+            delta = []
+            for key, entry in zip(keys, entries):
+                if key in seen:
+                    continue
+                seen.add(key)
                 summary_text = clean_html(entry.get("summary", ""))
-                
-                articles.append({
-                    "title": entry.title,
-                    "link": entry.link,
+                content_lower = (entry["title"] + " " + summary_text).lower()
+                delta.append({
+                    "guid": key,
+                    "feed": url,
+                    "title": entry["title"],
+                    "link": entry["link"],
                     "summary_en": summary_text,
                     "published": entry.get("published", ""),
-                    "content_lower": (entry.title + " " + summary_text).lower()
+                    "published_ts": parse_published(entry.get("published", "")),
+                    "content_lower": content_lower,
+                    "assets": classify_assets(content_lower)
                 })
+            
+            if delta:
+                scores = sentiment_scorer.score([a['title'] + " " + a['summary_en'] for a in delta])
+                for article, score in zip(delta, scores):
+                    article['sentiment'] = float(score)
+            
+            if c:
+                insert_articles(c, delta)
+                conn.commit()
+            new_articles.extend(delta)
         except Exception as e:
             st.error(f"Error fetching feed {url}: {str(e)}")
     
-    return articles
+    if conn:
+        conn.close()
+    return new_articles
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _translate_cached(text_limited, _timeout):
+    """แปลผ่าน shared cache (exception ไม่ถูก cache จึงลองใหม่ได้ใน rerun ถัดไป)"""
+    breaker = get_circuit_breakers()['translate']
+    return get_shared_cache().get_or_compute(
+        _translation_key(text_limited), TRANSLATION_CACHE_TTL,
+        lambda: breaker.call(lambda: GoogleTranslator(source='auto', target='th').translate(text_limited), _timeout),
+        wait_timeout=_timeout)
+
+def _translation_key(text_limited):
+    return 'translate:th:' + hashlib.sha1(text_limited.encode('utf-8')).hexdigest()
 
-@st.cache_data(ttl=3600)
-def translate_text(text):
+def translate_text(text, deadline=None):
     if not text or len(text.strip()) == 0:
         return text
+    text_limited = text[:500] + "..." if len(text) > 500 else text
     try:
-        text_limited = text[:500] + "..." if len(text) > 500 else text
-        return GoogleTranslator(source='auto', target='th').translate(text_limited)
+        return _translate_cached(text_limited, upstream_timeout(deadline))
     except Exception:
-        return text
+        # หมดเวลาหรือ circuit เปิด: ใช้คำแปลเดิมใน cache (แม้หมดอายุ) หรือข้อความต้นฉบับ
+        try:
+            return get_shared_cache().peek(_translation_key(text_limited)) or text
+        except Exception:
+            return text
 
-def analyze_gold_news(articles):
-    gold_articles = []
-    for article in articles:
-        if any(keyword in article['content_lower'] for keyword in GOLD_KEYWORDS):
-            gold_articles.append(article)
-    
-    if not gold_articles:
-        return None
-    
-    sentiment_scores = []
-    for article in gold_articles:
-        vs = analyzer.polarity_scores(article['title'] + " " + article['summary_en'])
-        sentiment_scores.append(vs['compound'])
-    
-    avg_sentiment = sum(sentiment_scores) / len(sentiment_scores) if sentiment_scores else 0
-    
-    return {
-        'articles': gold_articles,
-        'sentiment': avg_sentiment,
-        'article_count': len(gold_articles)
-    }
+def analyze_gold_news(news_state):
+    return news_state.asset_summary("ทองคำ (XAU)")
 
-def generate_gold_daily_summary(gold_data):
+def generate_gold_daily_summary(gold_data, deadline=None):
     if not gold_data:
         return None
     
@@ -575,9 +1643,9 @@ def generate_gold_daily_summary(gold_data):
     summaries_th = []
     for i, article in enumerate(articles, 1):
         try:
-            title_th = translate_text(article['title'])
+            title_th = translate_text(article['title'], deadline)
             summary_short = article['summary_en'][:150] + "..." if len(article['summary_en']) > 150 else article['summary_en']
-            summary_th = translate_text(summary_short)
+            summary_th = translate_text(summary_short, deadline)
             
             summaries_th.append(f"{i}. **{title_th}**\n   📝 {summary_th}")
         except:
@@ -608,12 +1676,15 @@ def generate_gold_daily_summary(gold_data):
 """
     return summary_report
 
-def generate_full_dashboard(articles):
+def generate_full_dashboard(news_state):
     results = {}
     
-    gold_data = analyze_gold_news(articles)
-    if gold_data:
-        avg_sent = gold_data['sentiment']
+    for asset_name in ASSETS:
+        asset_data = news_state.asset_summary(asset_name)
+        if not asset_data:
+            continue
+        
+        avg_sent = asset_data['sentiment']
         if avg_sent > 0.1:
             tone = "🟩 เชิงบวก"
             trend = "Bullish"
@@ -624,47 +1695,15 @@ def generate_full_dashboard(articles):
             tone = "⚪ เป็นกลาง"
             trend = "Neutral"
         
-        results["ทองคำ (XAU)"] = {
+        results[asset_name] = {
             "sentiment": avg_sent,
             "tone": tone,
             "trend": trend,
-            "articles": gold_data['articles'][:3],
-            "article_count": gold_data['article_count']
+            "articles": asset_data['articles'][:3],
+            "article_count": asset_data['article_count'],
+            "effective_count": asset_data['effective_count']
         }
     
-    for asset_name, keywords in ASSETS.items():
-        if asset_name == "ทองคำ (XAU)":
-            continue
-            
-        relevant = []
-        sentiment_scores = []
-        
-        for a in articles:
-            if any(kw in a['content_lower'] for kw in keywords):
-                vs = analyzer.polarity_scores(a["title"] + " " + a["summary_en"])
-                sentiment_scores.append(vs["compound"])
-                relevant.append(a)
-        
-        if sentiment_scores:
-            avg_sent = sum(sentiment_scores) / len(sentiment_scores)
-            if avg_sent > 0.1:
-                tone = "🟩 เชิงบวก"
-                trend = "Bullish"
-            elif avg_sent < -0.1:
-                tone = "🟥 เชิงลบ"
-                trend = "Bearish"
-            else:
-                tone = "⚪ เป็นกลาง"
-                trend = "Neutral"
-            
-            results[asset_name] = {
-                "sentiment": avg_sent,
-                "tone": tone,
-                "trend": trend,
-                "articles": relevant[:3],
-                "article_count": len(relevant)
-            }
-    
     return results
 
 # ---------- STREAMLIT APP ----------
@@ -691,6 +1730,7 @@ show_alerts = st.sidebar.checkbox("แสดงการแจ้งเตือ
 show_strategies = st.sidebar.checkbox("แสดงกลยุทธ์การเทรด", True)
 show_economic = st.sidebar.checkbox("แสดงปฏิทินเศรษฐกิจ", True)
 show_performance = st.sidebar.checkbox("แสดงประสิทธิภาพ", True)
+show_correlation = st.sidebar.checkbox("แสดงความสัมพันธ์ข้ามสินทรัพย์", True)
 
 if not HAS_YFINANCE:
     st.sidebar.warning("⚠️ yfinance ไม่ได้ถูกติดตั้ง ฟีเจอร์ราคาเรียลไทม์และวิเคราะห์ทางเทคนิคถูกปิด")
@@ -713,28 +1753,57 @@ st.sidebar.info("""
 
 # ดึงข้อมูลทั้งหมด
 with st.spinner('📡 กำลังดึงข้อมูลล่าสุด...'):
-    articles = get_news()
-    live_prices = get_live_prices() if show_live_prices else {}
-    important_alerts = check_important_news(articles) if show_alerts else []
-    gold_data = analyze_gold_news(articles)
-    results = generate_full_dashboard(articles)
+    render_deadline = Deadline(RENDER_BUDGET, RENDER_STAGES)
+    news_delta = get_news()
+    news_state = get_news_aggregator()
+    new_articles = news_state.update(news_delta)
+    articles = news_state.recent_articles()
+    live_prices = get_live_prices(render_deadline.stage('prices')) if show_live_prices else {}
+    compact_price_data()
+    # ตรวจกฎแจ้งเตือนกับข่าวใหม่เสมอ (แม้จะปิดการแสดงผล) เพื่อไม่ให้พลาดข่าว
+    fired_alerts = check_important_news(new_articles)
+    important_alerts = (get_recent_alerts() if db_initialized else fired_alerts) if show_alerts else []
+    gold_data = analyze_gold_news(news_state)
+    results = generate_full_dashboard(news_state)
     
     # วิเคราะห์ทางเทคนิค
     technical_data = {}
+    technical_deadline = render_deadline.stage('technical')
     if show_technical and results:
         for asset_name in results.keys():
             symbol = SYMBOLS.get(asset_name)
             if symbol:
-                technical_data[asset_name] = get_technical_analysis(symbol)
+                technical_data[asset_name] = get_technical_analysis(symbol, technical_deadline)
     
     # สร้างกลยุทธ์การเทรด
     trading_strategies = generate_trading_strategies(results, technical_data, live_prices) if show_strategies and results else []
     
+    # แท่งรายวันสำหรับปฏิทินและ correlation: sync เบื้องหลัง ระหว่างนั้นใช้แท่งที่มีใน database
+    if (show_economic or show_correlation) and db_initialized:
+        sync_error = run_in_background('daily_sync', sync_event_history, retry_after=DAILY_SYNC_RETRY)
+        if sync_error:
+            st.warning(f"Daily history sync error: {sync_error} (ใช้แท่งรายวันล่าสุดใน database)")
+    
     # ข้อมูลเศรษฐกิจ
-    economic_events = get_economic_calendar() if show_economic else []
+    if show_economic:
+        refresh_event_index()
+        economic_events = get_economic_calendar()
+    else:
+        economic_events = []
+    
+    # ความสัมพันธ์ข้ามสินทรัพย์ (อัปเดตเฉพาะแท่งรายวันใหม่)
+    if show_correlation:
+        cross_asset_monitor = get_cross_asset_monitor()
+        cross_asset_monitor.update()
+        cross_asset = cross_asset_monitor.snapshot()
+    else:
+        cross_asset = None
     
     # ประสิทธิภาพ
     performance_stats = get_performance_stats() if show_performance else None
+    
+    # เวลาที่เหลือของการ render ใช้กับการแปลข่าว
+    translate_deadline = render_deadline.stage('translate')
 
 if not articles:
     st.error("ไม่สามารถดึงข่าวได้ กรุณาลองใหม่ภายหลัง")
@@ -759,6 +1828,19 @@ if show_live_prices and live_prices:
                 delta=f"{price_data['change']:.2f}%",
                 delta_color="normal"
             )
+            if 'as_of' in price_data:
+                st.caption(f"⏱️ ราคาล่าสุดเมื่อ {format_age(price_data['as_of'])}")
+    
+    # ประวัติราคาจาก database (เลือกความละเอียดของแท่งตามช่วงเวลาอัตโนมัติ)
+    with st.expander("📉 ประวัติราคา"):
+        history_ranges = {"1 ชั่วโมง": 1/24, "1 วัน": 1, "7 วัน": 7, "30 วัน": 30, "1 ปี": 365}
+        range_label = st.selectbox("ช่วงเวลา", list(history_ranges.keys()), index=1)
+        history_start = datetime.now(thai_tz) - timedelta(days=history_ranges[range_label])
+        for asset_name, price_data in live_prices.items():
+            history = get_price_history(price_data['symbol'], history_start)
+            if not history.empty:
+                st.write(f"**{asset_name}** ({history.attrs['resolution']})")
+                st.line_chart(history.set_index('time')['close'])
 
 # แสดงการแจ้งเตือนข่าวสำคัญ
 if show_alerts and important_alerts:
@@ -771,7 +1853,7 @@ if show_alerts and important_alerts:
 
 # แสดงผลตามโหมดที่เลือก
 if app_mode == "🏆 Gold Daily Summary":
-    gold_summary = generate_gold_daily_summary(gold_data)
+    gold_summary = generate_gold_daily_summary(gold_data, translate_deadline)
     if gold_summary:
         st.markdown(gold_summary)
         
@@ -787,6 +1869,8 @@ if app_mode == "🏆 Gold Daily Summary":
                     st.metric("แนวโน้ม", f"{tech['trend_color']} {tech['trend']}")
                 with col3:
                     st.metric("RSI", f"{tech['rsi_color']} {tech['rsi']:.1f}{tech['rsi_signal']}")
+                if 'as_of' in tech:
+                    st.caption(f"⏱️ ข้อมูลทางเทคนิคเมื่อ {format_age(tech['as_of'])}")
     
     else:
         st.warning("ไม่พบข่าวทองคำล่าสุดในขณะนี้")
@@ -801,7 +1885,8 @@ elif app_mode == "📊 Full Market Dashboard":
         for idx, (asset_name, data) in enumerate(results.items()):
             with cols[idx]:
                 st.subheader(f"🔹 {asset_name}")
-                st.metric("Sentiment", f"{data['sentiment']:.3f}")
+                st.metric("Sentiment", f"{data['sentiment']:.3f}",
+                          help=f"ดัชนีถ่วงน้ำหนักตามเวลาเผยแพร่ (half-life {SENTIMENT_HALF_LIFE // 3600} ชม.)")
                 st.metric("แนวโน้ม", data['trend'])
                 st.metric("จำนวนข่าว", data['article_count'])
         
@@ -819,6 +1904,8 @@ elif app_mode == "📊 Full Market Dashboard":
                         st.write(f"RSI: {tech['rsi']:.1f}{tech['rsi_signal']}")
                         st.write(f"MA20: ${tech['ma20']:.2f}")
                         st.write(f"MA50: ${tech['ma50']:.2f}")
+                        if 'as_of' in tech:
+                            st.caption(f"⏱️ ข้อมูลเมื่อ {format_age(tech['as_of'])}")
         
         # แสดงกลยุทธ์การเทรด
         if show_strategies and trading_strategies:
@@ -842,7 +1929,7 @@ elif app_mode == "📊 Full Market Dashboard":
             for art in data["articles"]:
                 with st.container():
                     st.markdown(f"**[{art['title']}]({art['link']})**")
-                    summary_th = translate_text(art["summary_en"])
+                    summary_th = translate_text(art["summary_en"], translate_deadline)
                     st.write(f"→ {summary_th}")
                 st.markdown("---")
 
@@ -853,7 +1940,7 @@ elif app_mode == "🔍 โหมดเปรียบเทียบ":
     
     with col1:
         st.markdown("### 🏆 Gold Summary")
-        gold_summary = generate_gold_daily_summary(gold_data)
+        gold_summary = generate_gold_daily_summary(gold_data, translate_deadline)
         if gold_summary:
             st.markdown(gold_summary)
         else:
@@ -870,11 +1957,16 @@ elif app_mode == "🔍 โหมดเปรียบเทียบ":
                 st.markdown(f"{i}. **{art['title']}**")
 
 # แสดงปฏิทินเศรษฐกิจ
-if show_economic and economic_events:
+if show_economic:
     st.markdown("---")
-    st.subheader("📅 ปฏิทินเศรษฐกิจสำคัญ")
+    st.subheader("📅 ปฏิทินเศรษฐกิจสำคัญ (14 วันข้างหน้า)")
+    if not economic_events:
+        st.info("ไม่มีเหตุการณ์ในช่วงนี้ เพิ่มข้อมูลได้ที่ data/economic_calendar.csv")
+    unscheduled = get_unscheduled_event_types(datetime.now(thai_tz) + timedelta(days=14))
+    if unscheduled:
+        st.caption(f"⚠️ ยังไม่มีกำหนดการของ {', '.join(unscheduled)} ในช่วงนี้ใน data/economic_calendar.csv")
     for event in economic_events:
-        col1, col2, col3, col4 = st.columns([2,1,1,2])
+        col1, col2, col3, col4 = st.columns([2,1,1,3])
         with col1:
             st.write(f"**{event['event']}**")
         with col2:
@@ -882,7 +1974,35 @@ if show_economic and economic_events:
         with col3:
             st.write(f"⏰ {event['time']}")
         with col4:
-            st.write(f"⚡ {event['impact']} - {event['effect_on_gold']}")
+            st.write(f"⚡ {event['impact']}")
+            if not event['reactions']:
+                st.caption("ยังไม่มีข้อมูลราคาย้อนหลังสำหรับเหตุการณ์ประเภทนี้")
+            for asset_name, windows in event['reactions'].items():
+                day = windows.get('1d')
+                if day:
+                    st.caption(f"{asset_name}: เฉลี่ย {day['mean']:+.2f}% (±{day['std']:.2f}%, "
+                               f"{day['samples']} ครั้ง) ในวันประกาศ")
+
+# แสดงความสัมพันธ์ข้ามสินทรัพย์
+if show_correlation and cross_asset:
+    st.markdown("---")
+    st.subheader("🔗 ความสัมพันธ์ข้ามสินทรัพย์")
+    as_of = datetime.fromtimestamp(cross_asset['as_of'], pytz.utc).strftime('%d/%m/%Y')
+    st.caption(f"ผลตอบแทนรายวัน {cross_asset['days']} วันซื้อขายล่าสุด ถึง {as_of}")
+    
+    if cross_asset['dollar']:
+        cols = st.columns(len(cross_asset['dollar']))
+        for idx, (asset_name, sensitivity) in enumerate(cross_asset['dollar'].items()):
+            with cols[idx]:
+                st.metric(f"{asset_name} vs ดอลลาร์", f"{sensitivity['correlation']:+.2f}",
+                          help="correlation ของผลตอบแทนรายวันกับดอลลาร์")
+                st.caption(f"Beta: {sensitivity['beta']:+.2f} (ดอลลาร์ขึ้น 1% → {sensitivity['beta']:+.2f}%)")
+    
+    with st.expander("Correlation matrix และ sentiment กับผลตอบแทน"):
+        st.dataframe(cross_asset['matrix'].round(2))
+        for asset_name, value in cross_asset['sentiment'].items():
+            if not np.isnan(value):
+                st.write(f"**{asset_name}**: sentiment ข่าวรายวันกับผลตอบแทนวันเดียวกัน {value:+.2f}")
 
 # แสดงประสิทธิภาพ
 if show_performance and performance_stats:
@@ -902,7 +2022,7 @@ if show_performance and performance_stats:
 
 # บันทึกการวิเคราะห์รายวัน
 if results:
-    save_daily_analysis(results)
+    save_daily_analysis(results, gold_data)
 
 # Footer
 st.markdown("---")
@@ -923,32 +2043,45 @@ st.info("""
 st.markdown("---")
 st.subheader("📥 ดาวน์โหลดรายงาน")
 
+# รายงานถูกสร้างไว้แล้วตอนบันทึก snapshot ปุ่มดาวน์โหลดจึงอ่านจาก database โดยตรง
 col1, col2 = st.columns(2)
 with col1:
-    if st.button("ดาวน์โหลด Gold Summary"):
-        gold_summary = generate_gold_daily_summary(gold_data)
-        if gold_summary:
-            st.download_button(
-                label="📥 ดาวน์โหลด",
-                data=gold_summary,
-                file_name=f"gold_summary_{datetime.now(thai_tz).strftime('%Y%m%d')}.txt",
-                mime="text/plain"
-            )
+    gold_artifact = get_report_artifact('gold_summary', 'md')
+    if gold_artifact:
+        st.download_button(
+            label="📥 ดาวน์โหลด Gold Summary",
+            data=gold_artifact['content'],
+            file_name=f"gold_summary_{gold_artifact['date']}_v{gold_artifact['version']}.md",
+            mime=REPORT_FORMATS['md']
+        )
+    else:
+        st.caption("ยังไม่มี Gold Summary ที่บันทึกไว้")
 
 with col2:
-    if st.button("ดาวน์โหลด Full Report"):
-        full_report = "SmartMarket Dashboard Pro Report\n"
-        full_report += f"วันที่: {datetime.now(thai_tz).strftime('%d/%m/%Y %H:%M')}\n\n"
-        
-        if results:
-            for asset_name, data in results.items():
-                full_report += f"{asset_name}: {data['trend']} (Sentiment: {data['sentiment']:.3f})\n"
-        
+    report_format = st.selectbox("รูปแบบ Full Report", list(REPORT_FORMATS), format_func=str.upper)
+    report_artifact = get_report_artifact('full_report', report_format)
+    if report_artifact:
         st.download_button(
-            label="📥 ดาวน์โหลด",
-            data=full_report,
-            file_name=f"full_report_{datetime.now(thai_tz).strftime('%Y%m%d')}.txt",
-            mime="text/plain"
+            label="📥 ดาวน์โหลด Full Report",
+            data=report_artifact['content'],
+            file_name=f"full_report_{report_artifact['date']}_v{report_artifact['version']}.{report_format}",
+            mime=REPORT_FORMATS[report_format]
         )
+    else:
+        st.caption("ยังไม่มี Full Report ที่บันทึกไว้")
+
+if db_initialized:
+    with st.expander("📦 ส่งออกรายงานย้อนหลัง"):
+        today = datetime.now(thai_tz).date()
+        export_range = st.date_input("ช่วงวันที่", value=(today - timedelta(days=30), today))
+        if isinstance(export_range, (list, tuple)) and len(export_range) == 2:
+            export_start, export_end = (day.strftime("%Y-%m-%d") for day in export_range)
+            # สร้าง zip เมื่อกดปุ่มเท่านั้น (deferred) ไม่ใช่ทุกครั้งที่ rerun
+            st.download_button(
+                label="📥 ดาวน์โหลด zip",
+                data=lambda start=export_start, end=export_end: export_report_archive(start, end),
+                file_name=f"smartmarket_reports_{export_start}_{export_end}.zip",
+                mime="application/zip"
+            )
 
 st.caption("🧠 SmartMarket Dashboard Pro - รวมทุกฟีเจอร์ในการวิเคราะห์ตลาดการเงิน")
@@ -0,0 +1,258 @@
+"""นำเข้าข่าวย้อนหลังจากไฟล์ archive ลง database สำหรับ backtest
+
+รองรับไฟล์ RSS/Atom (.xml) และ JSONL (หนึ่งข่าวต่อบรรทัด: title, link, summary,
+published, guid) โดยอ่านแบบ streaming ผ่าน generator pipeline:
+
+    parse -> clean_html -> dedupe -> classify assets -> score (process pool) -> batch write
+
+หน่วยความจำคงที่ไม่ขึ้นกับขนาดไฟล์ และบันทึก checkpoint ใน db_meta ทุก batch
+รันซ้ำจะเริ่มต่อจากข่าวถัดไปของแต่ละไฟล์ (ใช้ --restart เพื่อเริ่มใหม่)
+
+วิธีใช้:
+    python backfill_news.py archive/gold-2024.xml dumps/news.jsonl --workers 4
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import xml.etree.ElementTree as ET
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from batch_sentiment import BatchSentimentScorer
+from market_core import (
+    DB_PATH, article_key, classify_assets, clean_html, get_db_meta,
+    init_meta_table, init_news_table, insert_articles, parse_published, set_db_meta
+)
+
+DEDUPE_WINDOW = 100_000  # จำนวนคีย์ล่าสุดที่จำไว้ใน memory (ที่เหลือ dedupe ด้วย UNIQUE ใน database)
+
+ITEM_TAGS = {'item', 'entry'}
+FIELD_TAGS = {
+    'title': 'title',
+    'link': 'link',
+    'description': 'summary',
+    'summary': 'summary',
+    'content': 'summary',
+    'encoded': 'summary',
+    'pubDate': 'published',
+    'published': 'published',
+    'updated': 'published',
+    'date': 'published',
+    'guid': 'guid',
+    'id': 'guid'
+}
+
+
+def _local_name(tag):
+    """ตัด namespace ออกจากชื่อ tag ของ XML"""
+    return tag.rsplit('}', 1)[-1]
+
+
+def iter_xml_records(path):
+    """อ่าน <item>/<entry> จากไฟล์ RSS/Atom ทีละรายการโดยไม่เก็บทั้ง tree"""
+    stack = []
+    for event, elem in ET.iterparse(path, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            continue
+        stack.pop()
+        if _local_name(elem.tag) not in ITEM_TAGS:
+            continue
+
+        record = {}
+        for child in elem:
+            field = FIELD_TAGS.get(_local_name(child.tag))
+            if not field or record.get(field):
+                continue
+            if field == 'link' and not (child.text or '').strip():
+                # Atom: <link href="..."/>
+                if child.get('rel', 'alternate') == 'alternate':
+                    record['link'] = child.get('href', '')
+                continue
+            record[field] = (child.text or '').strip()
+        yield record
+
+        # ทิ้ง element ที่อ่านแล้วเพื่อให้ memory คงที่
+        elem.clear()
+        if stack:
+            stack[-1].remove(elem)
+
+
+def iter_jsonl_records(path):
+    """อ่านข่าวจากไฟล์ JSONL ทีละบรรทัด"""
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield {
+                    'title': record.get('title', ''),
+                    'link': record.get('link', ''),
+                    'summary': record.get('summary') or record.get('summary_en') or record.get('description', ''),
+                    'published': record.get('published', ''),
+                    'guid': record.get('guid') or record.get('id', '')
+                }
+
+
+def iter_records(path):
+    """เลือกตัวอ่านตามนามสกุลไฟล์ และใส่ลำดับของข่าวในไฟล์ไว้ใช้กับ checkpoint"""
+    reader = iter_jsonl_records if path.endswith(('.jsonl', '.ndjson')) else iter_xml_records
+    for index, record in enumerate(reader(path)):
+        yield index, record
+
+
+def skip_until(records, checkpoint):
+    """ข้ามข่าวที่นำเข้าไปแล้วตาม checkpoint"""
+    for index, record in records:
+        if index > checkpoint:
+            yield index, record
+
+
+def track_read(records, progress):
+    """บันทึกลำดับล่าสุดที่อ่านจากไฟล์ลง progress['index'] (รวมข่าวที่ถูกตัดทิ้งภายหลัง)"""
+    for index, record in records:
+        progress['index'] = index
+        yield index, record
+
+
+def normalize(records, source):
+    """ทำความสะอาด HTML และแปลงเป็นรูปแบบ article เดียวกับ get_news"""
+    for index, record in records:
+        title = clean_html(record.get('title', '')).strip()
+        summary = clean_html(record.get('summary', ''))
+        published = record.get('published', '')
+        yield index, {
+            'guid': article_key(record.get('guid'), record.get('link'), title),
+            'feed': source,
+            'title': title,
+            'link': record.get('link', ''),
+            'summary_en': summary,
+            'published': published,
+            'published_ts': parse_published(published),
+            'content_lower': (title + " " + summary).lower()
+        }
+
+
+def dedupe(articles, window=DEDUPE_WINDOW):
+    """ตัดข่าวซ้ำด้วย LRU ของคีย์ล่าสุด (ขนาดจำกัด)"""
+    seen = OrderedDict()
+    for index, article in articles:
+        key = article['guid']
+        if key in seen:
+            seen.move_to_end(key)
+            continue
+        seen[key] = None
+        if len(seen) > window:
+            seen.popitem(last=False)
+        yield index, article
+
+
+def classify(articles):
+    """ระบุสินทรัพย์ที่ข่าวเกี่ยวข้อง"""
+    for index, article in articles:
+        article['assets'] = classify_assets(article['content_lower'])
+        yield index, article
+
+
+def batched(items, size):
+    """รวม item เป็น list ละ size รายการ"""
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+_worker_scorer = None
+
+
+def _init_worker():
+    """สร้าง scorer หนึ่งตัวต่อ worker process"""
+    global _worker_scorer
+    _worker_scorer = BatchSentimentScorer()
+
+
+def _score_texts(texts):
+    """ให้คะแนน compound ใน worker process"""
+    return _worker_scorer.score(texts).tolist()
+
+
+def score_batches(batches, executor, max_pending):
+    """ส่ง batch ไปให้คะแนนใน process pool โดยจำกัดจำนวนงานค้าง และคืนผลตามลำดับเดิม"""
+    pending = deque()
+    for batch in batches:
+        texts = [article['title'] + " " + article['summary_en'] for _, article in batch]
+        pending.append((batch, executor.submit(_score_texts, texts)))
+        if len(pending) >= max_pending:
+            yield _attach_scores(*pending.popleft())
+    while pending:
+        yield _attach_scores(*pending.popleft())
+
+
+def _attach_scores(batch, future):
+    for (_, article), score in zip(batch, future.result()):
+        article['sentiment'] = score
+    return batch
+
+
+def backfill_file(conn, path, executor, batch_size, max_pending, restart=False):
+    """นำเข้าไฟล์เดียว คืน (จำนวนข่าวที่อ่าน, จำนวนข่าวที่เพิ่มใหม่)"""
+    c = conn.cursor()
+    checkpoint_key = f'backfill:{os.path.abspath(path)}'
+    checkpoint = -1 if restart else int(get_db_meta(c, checkpoint_key, -1))
+    source = os.path.basename(path)
+
+    progress = {'index': checkpoint}
+    pipeline = track_read(skip_until(iter_records(path), checkpoint), progress)
+    pipeline = classify(dedupe(normalize(pipeline, source)))
+
+    processed = inserted = 0
+    for batch in score_batches(batched(pipeline, batch_size), executor, max_pending):
+        # หนึ่ง transaction ต่อ batch: ข่าวและ checkpoint ถูกบันทึกพร้อมกัน
+        with conn:
+            inserted += insert_articles(c, [article for _, article in batch])
+            set_db_meta(c, checkpoint_key, batch[-1][0])
+        processed += len(batch)
+        print(f"  {source}: {processed} processed, {inserted} new", end='\r', flush=True)
+
+    # ทุก batch ถูกบันทึกแล้ว: เลื่อน checkpoint ข้ามข่าวซ้ำท้ายไฟล์ที่ dedupe ตัดทิ้ง
+    if progress['index'] > checkpoint:
+        with conn:
+            set_db_meta(c, checkpoint_key, progress['index'])
+    print(f"  {source}: {processed} processed, {inserted} new")
+    return processed, inserted
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill historical news into the SmartMarket database")
+    parser.add_argument('paths', nargs='+', help="ไฟล์ RSS/Atom (.xml) หรือ JSONL")
+    parser.add_argument('--db', default=DB_PATH, help="path ของ database")
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="จำนวน process สำหรับให้คะแนน")
+    parser.add_argument('--batch-size', type=int, default=1000, help="จำนวนข่าวต่อ batch/transaction")
+    parser.add_argument('--restart', action='store_true', help="ไม่ใช้ checkpoint เดิม")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    c = conn.cursor()
+    init_meta_table(c)
+    init_news_table(c)
+    conn.commit()
+
+    total_processed = total_inserted = 0
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as executor:
+        for path in args.paths:
+            processed, inserted = backfill_file(conn, path, executor, args.batch_size,
+                                                max_pending=args.workers * 2, restart=args.restart)
+            total_processed += processed
+            total_inserted += inserted
+
+    conn.close()
+    print(f"done: {total_processed} processed, {total_inserted} new articles")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
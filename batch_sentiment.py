@@ -0,0 +1,272 @@
+"""ตัวให้คะแนน sentiment แบบ batch ที่ใช้ lexicon และกฎเดียวกับ VADER
+
+ตัด token ของทุกข้อความในครั้งเดียว แปลง token เป็น id ผ่าน hash index
+แล้วคำนวณ valence, booster, negation, ALL CAPS, 'but' และเครื่องหมายวรรคตอน
+ด้วย numpy บน array ของทั้ง batch
+
+emoji ถูกแทนด้วยคำอธิบายจาก emoji lexicon ของ VADER และ special idioms ("the bomb",
+"yeah right" ฯลฯ) ใช้ค่าจาก SPECIAL_CASES เหมือน VADER
+
+ความคลาดเคลื่อนจาก vaderSentiment.polarity_scores (ค่า compound):
+- ข้อความข่าวทั่วไปได้ค่าตรงกัน (ต่างกันไม่เกิน COMPOUND_TOLERANCE)
+- ข้อความที่มี 'but' ร่วมกับ valence ที่ซ้ำกันอาจต่างได้ เพราะ VADER ใช้ list.index()
+  ซึ่งให้ผลขึ้นกับค่าที่ซ้ำกัน ส่วนที่นี่คูณตามตำแหน่งก่อน/หลัง 'but' ตรง ๆ
+ตรวจสอบด้วย `python benchmarks.py sentiment`
+"""
+import string
+
+import numpy as np
+from vaderSentiment.vaderSentiment import (
+    BOOSTER_DICT, C_INCR, N_SCALAR, NEGATE, SPECIAL_CASES, SentimentIntensityAnalyzer
+)
+
+COMPOUND_TOLERANCE = 0.05  # ความต่างสูงสุดของ compound ที่ยอมรับสำหรับข่าวทั่วไป
+NORMALIZE_ALPHA = 15
+
+
+class BatchSentimentScorer:
+    """ให้คะแนน compound แบบ VADER สำหรับข้อความจำนวนมากในครั้งเดียว"""
+
+    def __init__(self, analyzer=None):
+        analyzer = analyzer or SentimentIntensityAnalyzer()
+        self.lexicon = analyzer.lexicon
+        self.emojis = analyzer.emojis
+
+        # hash index: token ดิบ -> (vocab id, เป็นตัวพิมพ์ใหญ่ทั้งคำหรือไม่)
+        self._token_index = {}
+        # vocab id ของคำ (ตัวพิมพ์เล็ก) และคุณสมบัติที่คำนวณไว้ล่วงหน้า
+        self._vocab = {}
+        self._valence = []
+        self._in_lexicon = []
+        self._booster = []
+        self._negation = []
+        self._arrays = None
+
+        # คำที่กฎของ VADER ตรวจสอบแบบเจาะจง
+        for word in ('no', 'least', 'at', 'very', 'never', 'so', 'this', 'without', 'doubt',
+                     'or', 'nor', 'but', 'kind', 'of'):
+            self._word_id(word)
+        self._special = dict(self._vocab)
+        self._bigram_boosters = {
+            tuple(self._word_id(word) for word in phrase.split()): scalar
+            for phrase, scalar in BOOSTER_DICT.items() if ' ' in phrase
+        }
+        self._idioms = {
+            tuple(self._word_id(word) for word in phrase.split()): valence
+            for phrase, valence in SPECIAL_CASES.items() if ' ' in phrase
+        }
+
+    def _word_id(self, word):
+        """คืน vocab id ของคำ (ตัวพิมพ์เล็ก) และเพิ่มลง index ถ้ายังไม่มี"""
+        word_id = self._vocab.get(word)
+        if word_id is None:
+            word_id = len(self._vocab)
+            self._vocab[word] = word_id
+            self._valence.append(self.lexicon.get(word, 0.0))
+            self._in_lexicon.append(word in self.lexicon)
+            self._booster.append(BOOSTER_DICT.get(word, 0.0))
+            self._negation.append(word in NEGATE or "n't" in word)
+            self._arrays = None
+        return word_id
+
+    def _token(self, raw):
+        """แปลง token ดิบเป็น (vocab id, is_upper) ผ่าน cache"""
+        entry = self._token_index.get(raw)
+        if entry is None:
+            stripped = raw.strip(string.punctuation)
+            token = raw if len(stripped) <= 2 else stripped
+            entry = (self._word_id(token.lower()), token.isupper())
+            self._token_index[raw] = entry
+        return entry
+
+    def _match_idioms(self, sequence, idiom):
+        """ใส่ค่าของ idiom ที่ตรงกับลำดับ token (tuple ของ array) ทับค่าใน idiom"""
+        for phrase, value in self._idioms.items():
+            if len(phrase) != len(sequence):
+                continue
+            matched = np.ones(len(idiom), dtype=bool)
+            for column, word_id in zip(sequence, phrase):
+                matched &= column == word_id
+            idiom = np.where(matched, value, idiom)
+        return idiom
+
+    def _lookup_arrays(self):
+        """สร้าง array ของ vocab ใหม่เมื่อมีคำเพิ่ม"""
+        if self._arrays is None:
+            self._arrays = (
+                np.array(self._valence, dtype=np.float64),
+                np.array(self._in_lexicon, dtype=bool),
+                np.array(self._booster, dtype=np.float64),
+                np.array(self._negation, dtype=bool)
+            )
+        return self._arrays
+
+    def replace_emoji(self, text):
+        """แทน emoji ด้วยคำอธิบาย (เหมือนขั้นแรกของ polarity_scores)"""
+        if not text or text.isascii():
+            return text
+        parts = []
+        prev_space = True
+        for char in text:
+            description = self.emojis.get(char)
+            if description is not None:
+                if not prev_space:
+                    parts.append(' ')
+                parts.append(description)
+                prev_space = False
+            else:
+                parts.append(char)
+                prev_space = char == ' '
+        return ''.join(parts).strip()
+
+    def tokenize(self, texts):
+        """ตัด token ของทุกข้อความเป็น array แบน (ids, is_upper, lengths)"""
+        ids = []
+        upper = []
+        lengths = np.zeros(len(texts), dtype=np.int64)
+        token = self._token
+        for n, text in enumerate(texts):
+            words = text.split() if text else []
+            lengths[n] = len(words)
+            for raw in words:
+                word_id, is_upper = token(raw)
+                ids.append(word_id)
+                upper.append(is_upper)
+        return np.array(ids, dtype=np.int64), np.array(upper, dtype=bool), lengths
+
+    def score(self, texts):
+        """คืน numpy array ของค่า compound (ปัดเศษ 4 ตำแหน่งแบบ VADER)"""
+        texts = [self.replace_emoji(text) for text in texts]
+        n_docs = len(texts)
+        if n_docs == 0:
+            return np.zeros(0)
+
+        ids, upper, lengths = self.tokenize(texts)
+        valence_of, in_lexicon, booster_of, negation_of = self._lookup_arrays()
+        special = self._special
+
+        total = len(ids)
+        doc = np.repeat(np.arange(n_docs), lengths)
+        starts = np.cumsum(lengths) - lengths
+        pos = np.arange(total) - starts[doc]
+        end = lengths[doc]
+
+        # ALL CAPS มีผลเฉพาะเมื่อบางคำ (ไม่ใช่ทุกคำ) เป็นตัวพิมพ์ใหญ่
+        upper_count = np.bincount(doc, weights=upper, minlength=n_docs)
+        cap_diff = ((upper_count > 0) & (upper_count < lengths))[doc]
+        caps = upper & cap_diff
+
+        def shifted(values, k, fill):
+            """ค่าของ token ที่อยู่ก่อนหน้า k ตำแหน่งในข้อความเดียวกัน"""
+            out = np.full(total, fill, dtype=values.dtype)
+            if k < total:
+                out[k:] = values[:-k]
+            out[pos < k] = fill
+            return out
+
+        is_lex = in_lexicon[ids] & (booster_of[ids] == 0)
+        base = valence_of[ids]
+        valence = np.where(is_lex, base, 0.0)
+
+        # "no" ที่ตามด้วยคำใน lexicon ถูกใช้เป็นคำปฏิเสธ ไม่ใช่คำที่มี valence
+        next_ids = np.full(total, -1)
+        next_ids[:-1] = ids[1:]
+        next_in_lex = np.zeros(total, dtype=bool)
+        has_next = pos < end - 1
+        next_in_lex[has_next] = in_lexicon[next_ids[has_next]]
+        next2_ids = np.full(total, -1)
+        next2_ids[:-2] = ids[2:]
+        next2_ids[pos >= end - 2] = -1
+        next_ids[~has_next] = -1
+        valence[(ids == special['no']) & next_in_lex] = 0.0
+        is_kind_of = (ids == special['kind']) & has_next & (next_ids == special['of'])
+        is_lex &= ~is_kind_of
+        valence[is_kind_of] = 0.0
+
+        prev = [None] + [shifted(ids, k, -1) for k in (1, 2, 3)]
+        no_id = special['no']
+        after_no = ((prev[1] == no_id) | (prev[2] == no_id)
+                    | ((prev[3] == no_id) & np.isin(prev[1], [special['or'], special['nor']])))
+        valence = np.where(is_lex & after_no, base * N_SCALAR, valence)
+
+        valence = np.where(is_lex & caps, np.where(valence > 0, valence + C_INCR, valence - C_INCR), valence)
+
+        # booster และ negation จาก 3 คำก่อนหน้าที่ไม่อยู่ใน lexicon
+        damp = {1: 1.0, 2: 0.95, 3: 0.9}
+        upper_prev = [None] + [shifted(upper, k, False) for k in (1, 2, 3)]
+        for k in (1, 2, 3):
+            prev_ids = prev[k]
+            valid = is_lex & (prev_ids >= 0)
+            safe_prev = np.where(valid, prev_ids, 0)
+            valid &= ~in_lexicon[safe_prev]
+
+            scalar = booster_of[safe_prev]
+            scalar = np.where(valence < 0, -scalar, scalar)
+            boosted = scalar != 0
+            prev_caps = boosted & upper_prev[k] & cap_diff
+            scalar = np.where(prev_caps, np.where(valence > 0, scalar + C_INCR, scalar - C_INCR), scalar)
+            valence = np.where(valid, valence + scalar * damp[k], valence)
+
+            negated = negation_of[safe_prev]
+            if k == 1:
+                valence = np.where(valid & negated, valence * N_SCALAR, valence)
+            elif k == 2:
+                never_so = (prev[2] == special['never']) & np.isin(prev[1], [special['so'], special['this']])
+                without_doubt = (prev[2] == special['without']) & (prev[1] == special['doubt'])
+                valence = np.where(valid & never_so, valence * 1.25, valence)
+                valence = np.where(valid & ~never_so & ~without_doubt & negated, valence * N_SCALAR, valence)
+            else:
+                so_this = [special['so'], special['this']]
+                never_so = (((prev[3] == special['never']) & np.isin(prev[2], so_this))
+                            | np.isin(prev[1], so_this))
+                without_doubt = (prev[3] == special['without']) & (
+                    (prev[2] == special['doubt']) | (prev[1] == special['doubt']))
+                valence = np.where(valid & never_so, valence * 1.25, valence)
+                valence = np.where(valid & ~never_so & ~without_doubt & negated, valence * N_SCALAR, valence)
+
+                # special idioms แทนค่า valence: ลำดับเดียวกับ _special_idioms_check (ตัวที่ตรงก่อนชนะ
+                # ในกลุ่มคำก่อนหน้า แล้วกลุ่มคำถัดไปเขียนทับ)
+                current = ids
+                backward = [(prev[1], current), (prev[2], prev[1], current), (prev[2], prev[1]),
+                            (prev[3], prev[2], prev[1]), (prev[3], prev[2])]
+                forward = [(current, next_ids), (current, next_ids, next2_ids)]
+                idiom = np.full(total, np.nan)
+                for sequence in reversed(backward):
+                    idiom = self._match_idioms(sequence, idiom)
+                for sequence in forward:
+                    idiom = self._match_idioms(sequence, idiom)
+                valence = np.where(valid & ~np.isnan(idiom), idiom, valence)
+
+                # booster แบบสองคำ เช่น "kind of", "sort of", "just enough"
+                for (first, second), scalar in self._bigram_boosters.items():
+                    for left, right in ((prev[3], prev[2]), (prev[2], prev[1])):
+                        valence = np.where(valid & (left == first) & (right == second), valence + scalar, valence)
+
+        # "least" ก่อนคำ (ยกเว้น "at least" / "very least") ทำให้กลับขั้ว
+        least = special['least']
+        prev1_least = is_lex & (prev[1] == least)
+        keep = (pos > 1) & np.isin(prev[2], [special['at'], special['very']])
+        valence = np.where(prev1_least & ~keep, valence * N_SCALAR, valence)
+
+        # 'but': ลดน้ำหนักคำก่อนหน้าและเพิ่มน้ำหนักคำหลัง 'but' ตัวแรก
+        is_but = ids == special['but']
+        first_but = np.full(n_docs, np.iinfo(np.int64).max)
+        if is_but.any():
+            np.minimum.at(first_but, doc[is_but], pos[is_but])
+        but_pos = first_but[doc]
+        valence = np.where(pos < but_pos, np.where(but_pos < end, valence * 0.5, valence), valence)
+        valence = np.where((pos > but_pos) & (but_pos < end), valence * 1.5, valence)
+
+        sums = np.bincount(doc, weights=valence, minlength=n_docs)
+
+        # เครื่องหมาย ! และ ? เพิ่มความเข้มของ sentiment
+        exclaim = np.array([text.count('!') if text else 0 for text in texts], dtype=np.float64)
+        question = np.array([text.count('?') if text else 0 for text in texts], dtype=np.float64)
+        amplifier = np.minimum(exclaim, 4) * 0.292
+        amplifier += np.where(question > 3, 0.96, np.where(question > 1, question * 0.18, 0.0))
+        sums = sums + np.sign(sums) * amplifier
+
+        compound = sums / np.sqrt(sums * sums + NORMALIZE_ALPHA)
+        compound = np.where(lengths > 0, np.clip(compound, -1.0, 1.0), 0.0)
+        return np.round(compound, 4)
+
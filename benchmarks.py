@@ -0,0 +1,303 @@
+"""Benchmark และการตรวจสอบความถูกต้องของส่วนที่ปรับปรุงประสิทธิภาพ
+
+วิธีใช้:
+    python benchmarks.py sentiment [--size 20000] [--input news.jsonl]
+    python benchmarks.py clean_html [--size 20000]
+    python benchmarks.py alerts [--size 20000]
+"""
+import argparse
+import json
+import random
+import re
+import sys
+import time
+
+import numpy as np
+from bs4 import BeautifulSoup
+from vaderSentiment.vaderSentiment import BOOSTER_DICT, NEGATE, SPECIAL_CASES, SentimentIntensityAnalyzer
+
+import market_core
+from market_core import ASSETS, AlertRuleEngine, classify_assets
+from batch_sentiment import COMPOUND_TOLERANCE, BatchSentimentScorer
+
+SAMPLE_HEADLINES = [
+    "Gold price hits record high as Fed signals rate cuts",
+    "Gold slips as strong dollar weighs on bullion demand",
+    "Silver rallies on robust industrial demand, outlook remains bright",
+    "Bitcoin plunges 10% amid fears of tougher crypto regulation",
+    "Bitcoin ETF inflows surge to best week since launch",
+    "Fed's Powell warns inflation fight is not over yet",
+    "Gold steady ahead of CPI data; traders cautious",
+    "XAUUSD: bulls fail to hold gains despite weak USD",
+    "Precious metals crash as yields spike after hot jobs report",
+    "Analysts say gold is no longer a safe haven for investors",
+    "Silver price forecast: XAGUSD bears target key support",
+    "Crypto market loses $200 billion in brutal sell-off!",
+    "Why gold could be the best trade of the year",
+    "Bitcoin miners struggle as hashprice sinks to record low",
+    "Gold demand from central banks remains extremely strong",
+    "Inflation cools more than expected, boosting gold and silver",
+    "Investors are not worried about the dollar rally",
+    "Is bitcoin really dead again??",
+    "Gold ETFs see outflows but physical demand holds up well",
+    "Geopolitical tensions lift gold; war risk rattles markets",
+]
+
+
+# emoji และ special idioms ที่ VADER จัดการแยกจาก lexicon ปกติ
+SENTIMENT_EDGE_CASES = [
+    "Gold 😂 surges",
+    "Gold is the bomb 😀",
+    "Bitcoin💰🚀 to the moon",
+    "Silver rally? Yeah right, traders say",
+    "Strong dollar is the kiss of death for gold bulls",
+    "This gold setup is to die for!",
+    "Analysts call the crypto crash the shit show of the year 😡",
+]
+
+
+def build_corpus(size, seed=7):
+    """สร้างชุดข้อความทดสอบจากพาดหัวตัวอย่างและประโยคสุ่มที่มีกฎของ VADER ปนอยู่"""
+    rng = random.Random(seed)
+    lexicon_words = list(SentimentIntensityAnalyzer().lexicon)
+    fillers = ["gold", "price", "market", "the", "dollar", "bitcoin", "traders", "today", "silver", "fed"]
+    fillers += [word for phrase in SPECIAL_CASES for word in phrase.split()]
+    emojis = list(SentimentIntensityAnalyzer().emojis)[:200]
+    modifiers = list(BOOSTER_DICT) + NEGATE[:20] + ["no", "but", "least", "at least"]
+
+    corpus = []
+    while len(corpus) < size:
+        if rng.random() < 0.5:
+            corpus.append(rng.choice(SAMPLE_HEADLINES))
+            continue
+        words = []
+        for _ in range(rng.randint(4, 20)):
+            roll = rng.random()
+            if roll < 0.25:
+                word = rng.choice(lexicon_words)
+            elif roll < 0.35:
+                word = rng.choice(modifiers)
+            elif roll < 0.38:
+                word = rng.choice(emojis)
+            else:
+                word = rng.choice(fillers)
+            if rng.random() < 0.03:
+                word = word.upper()
+            words.append(word)
+        corpus.append(" ".join(words) + rng.choice([".", "", "!", "?", "??", ", right"]))
+    return corpus
+
+
+def load_texts(path):
+    """อ่านข้อความ (title + summary) จากไฟล์ JSONL"""
+    texts = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                texts.append(f"{record.get('title', '')} {record.get('summary', '')}")
+    return texts
+
+
+def bench_sentiment(args):
+    """เปรียบเทียบ batch scorer กับ vaderSentiment ทั้งความถูกต้องและ throughput"""
+    texts = load_texts(args.input) if args.input else build_corpus(args.size)
+    analyzer = SentimentIntensityAnalyzer()
+
+    start = time.perf_counter()
+    reference = np.array([analyzer.polarity_scores(text)['compound'] for text in texts])
+    vader_seconds = time.perf_counter() - start
+
+    scorer = BatchSentimentScorer(analyzer)
+    start = time.perf_counter()
+    batch = scorer.score(texts)
+    batch_cold = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = scorer.score(texts)
+    batch_warm = time.perf_counter() - start
+
+    diff = np.abs(batch - reference)
+    within = float(np.mean(diff <= COMPOUND_TOLERANCE))
+    headline_diff = np.abs(scorer.score(SAMPLE_HEADLINES)
+                           - np.array([analyzer.polarity_scores(t)['compound'] for t in SAMPLE_HEADLINES]))
+    edge_diff = np.abs(scorer.score(SENTIMENT_EDGE_CASES)
+                       - np.array([analyzer.polarity_scores(t)['compound'] for t in SENTIMENT_EDGE_CASES]))
+
+    print(f"texts: {len(texts)}")
+    print(f"vaderSentiment : {vader_seconds:.3f}s ({len(texts) / vader_seconds:,.0f} texts/s)")
+    print(f"batch (cold)   : {batch_cold:.3f}s ({len(texts) / batch_cold:,.0f} texts/s)")
+    print(f"batch (warm)   : {batch_warm:.3f}s ({len(texts) / batch_warm:,.0f} texts/s)")
+    print(f"speedup (warm) : {vader_seconds / batch_warm:.1f}x")
+    print(f"exact match    : {np.mean(diff == 0):.2%}")
+    print(f"|diff| <= {COMPOUND_TOLERANCE}: {within:.2%} (max {diff.max():.4f}, mean {diff.mean():.5f})")
+    print(f"sample headlines max |diff|: {headline_diff.max():.4f}")
+    print(f"emoji/idiom cases max |diff|: {edge_diff.max():.4f}")
+
+    # ข่าวจริงและกรณี emoji/idiom ต้องอยู่ในค่าความคลาดเคลื่อนทั้งหมด และชุดสุ่มต้องเกือบทั้งหมด
+    ok = (headline_diff.max() <= COMPOUND_TOLERANCE and edge_diff.max() <= COMPOUND_TOLERANCE
+          and within >= 0.99)
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+HTML_EDGE_CASES = [
+    '&copy2024 Reuters',
+    '&amp',
+    '&ampfoo',
+    'AT&T &#39x &#x27',
+    '<b>Gold &amp; silver</b>&nbsp;&copy2024',
+    'Fed minutes&#1; <font>Reuters</font>',
+    '<a href="#">Gold</a>\t<font>Kitco</font>',
+]
+
+
+def build_html_corpus(size, unique, seed=7):
+    """สร้าง summary แบบ Google News (unique รายการไม่ซ้ำ) ปนกับ markup ที่ซับซ้อน"""
+    rng = random.Random(seed)
+    sources = ["Reuters", "Kitco NEWS", "Bloomberg", "CNBC", "FXStreet", "CoinDesk"]
+    templates = [
+        '<a href="https://news.google.com/rss/articles/CBMi{n}?oc=5" target="_blank">{title}</a>'
+        '&nbsp;&nbsp;<font color="#6f6f6f">{source}</font>',
+        '<ol><li><a href="https://news.google.com/rss/articles/CBMi{n}?oc=5" target="_blank">{title}</a>'
+        '&nbsp;&nbsp;<font color="#6f6f6f">{source}</font></li></ol>',
+        '<p>{title} &amp; more &mdash; {source}<br/></p>',
+        '<!-- ad --><table><tr><td>{title}</td></tr></table><script>var n = {n} < 2;</script>',
+    ]
+    # entity ที่ไม่มี ; ปิดท้าย, อักขระควบคุม และช่องว่างล้วน ซึ่ง html.unescape ถอดต่างจาก BeautifulSoup
+    unique_items = list(HTML_EDGE_CASES)
+    for n in range(unique):
+        template = templates[3] if rng.random() < 0.05 else rng.choice(templates[:3])
+        title = rng.choice(SAMPLE_HEADLINES).replace("&", "&amp;")
+        unique_items.append(template.format(n=n, title=title, source=rng.choice(sources)))
+    return [rng.choice(unique_items) for _ in range(size)], unique_items
+
+
+def bench_clean_html(args):
+    """เปรียบเทียบ clean_html (fast path + cache) กับ BeautifulSoup ต่อข่าว"""
+    corpus, unique_items = build_html_corpus(args.size, args.unique)
+
+    start = time.perf_counter()
+    reference = [BeautifulSoup(item, "html.parser").get_text() for item in corpus]
+    soup_seconds = time.perf_counter() - start
+
+    market_core._clean_html_cache.clear()
+    start = time.perf_counter()
+    uncached = [market_core._strip_simple_html(item) for item in corpus]
+    uncached = [market_core._clean_html_full(item) if text is None else text
+                for item, text in zip(corpus, uncached)]
+    fast_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    cached = [market_core.clean_html(item) for item in corpus]
+    cached_seconds = time.perf_counter() - start
+
+    fallback = sum(market_core._strip_simple_html(item) is None for item in unique_items)
+    mismatches = sum(a != b for a, b in zip(reference, cached)) + sum(a != b for a, b in zip(reference, uncached))
+
+    print(f"summaries: {len(corpus)} ({len(unique_items)} unique, {fallback} need full parser)")
+    print(f"BeautifulSoup        : {soup_seconds * 1e6 / len(corpus):8.1f} us/entry")
+    print(f"fast path (no cache) : {fast_seconds * 1e6 / len(corpus):8.1f} us/entry "
+          f"({soup_seconds / fast_seconds:.1f}x)")
+    print(f"clean_html (cached)  : {cached_seconds * 1e6 / len(corpus):8.1f} us/entry "
+          f"({soup_seconds / cached_seconds:.1f}x)")
+    print(f"mismatches vs BeautifulSoup: {mismatches}")
+
+    ok = mismatches == 0 and fast_seconds < soup_seconds
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+# กฎที่ตรงข้อความเดียวกัน (keyword ซ้ำ, keyword ที่ซ้อนกัน) และ regex ที่มี group/backreference ของตัวเอง
+OVERLAPPING_RULES = [
+    {"id": "fed_any", "keywords": ["fed"]},
+    {"id": "fed_gold", "keywords": ["fed"], "asset": "ทองคำ (XAU)"},
+    {"id": "rate_cut", "keywords": ["interest rate cut"]},
+    {"id": "rate", "keywords": ["interest rate"]},
+    {"id": "repeat", "regex": r"(?P<rule0>\w+) \1"},
+]
+OVERLAPPING_TEXT = "fed signals interest rate cut cut"
+
+
+def reference_alerts(rules, article):
+    """ตรวจกฎทีละข้อทีละ keyword (ผลอ้างอิงของ AlertRuleEngine)"""
+    text = article['content_lower']
+    sentiment = article.get('sentiment') or 0.0
+    fired = []
+    for rule in rules:
+        matched = any(re.search(r'(?<![a-z0-9])' + re.escape(keyword.lower()) + r'(?![a-z0-9])', text, re.IGNORECASE)
+                      for keyword in rule.get('keywords', []))
+        matched = matched or bool(rule.get('regex') and re.search(rule['regex'], text, re.IGNORECASE))
+        if not matched:
+            continue
+        if rule.get('asset') and rule['asset'] not in article.get('assets', []):
+            continue
+        if rule.get('min_sentiment') is not None and sentiment < rule['min_sentiment']:
+            continue
+        if rule.get('max_sentiment') is not None and sentiment > rule['max_sentiment']:
+            continue
+        fired.append(rule['id'])
+    return fired
+
+
+def bench_alerts(args):
+    """ตรวจว่า AlertRuleEngine แจ้งเตือนครบทุกกฎที่ตรง (เทียบกับการตรวจทีละกฎ) และวัด throughput"""
+    with open(args.rules, encoding='utf-8') as f:
+        rules = json.load(f) + OVERLAPPING_RULES
+    rng = random.Random(7)
+    articles = []
+    for text in build_corpus(args.size - 1) + [OVERLAPPING_TEXT]:
+        content_lower = text.lower()
+        articles.append({'content_lower': content_lower, 'assets': classify_assets(content_lower) or list(ASSETS)[:1],
+                         'sentiment': rng.uniform(-1, 1)})
+
+    start = time.perf_counter()
+    reference = [reference_alerts(rules, article) for article in articles]
+    reference_seconds = time.perf_counter() - start
+
+    engine = AlertRuleEngine(rules)
+    start = time.perf_counter()
+    fired = [[rule['id'] for rule in engine.match(article)] for article in articles]
+    engine_seconds = time.perf_counter() - start
+
+    mismatches = sum(a != b for a, b in zip(reference, fired))
+    overlapping = fired[-1]
+    expected = [rule['id'] for rule in OVERLAPPING_RULES]
+
+    print(f"articles: {len(articles)}, rules: {len(rules)}, alerts: {sum(map(len, fired))}")
+    print(f"per-rule scan  : {reference_seconds * 1e6 / len(articles):8.1f} us/article")
+    print(f"rule engine    : {engine_seconds * 1e6 / len(articles):8.1f} us/article "
+          f"({reference_seconds / engine_seconds:.1f}x)")
+    print(f"overlapping rules fired: {[rule_id for rule_id in overlapping if rule_id in expected]}")
+    print(f"mismatches vs per-rule scan: {mismatches}")
+
+    ok = mismatches == 0 and all(rule_id in overlapping for rule_id in expected)
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SmartMarket benchmarks")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    sentiment = sub.add_parser("sentiment", help="batch sentiment vs vaderSentiment")
+    sentiment.add_argument("--size", type=int, default=20000, help="จำนวนข้อความในชุดทดสอบ")
+    sentiment.add_argument("--input", help="ไฟล์ JSONL ที่มี title/summary (แทนชุดทดสอบที่สร้างขึ้น)")
+    sentiment.set_defaults(func=bench_sentiment)
+
+    cleaner = sub.add_parser("clean_html", help="fast-path clean_html vs BeautifulSoup")
+    cleaner.add_argument("--size", type=int, default=20000, help="จำนวน summary ที่ประมวลผล")
+    cleaner.add_argument("--unique", type=int, default=2000, help="จำนวน summary ที่ไม่ซ้ำกัน")
+    cleaner.set_defaults(func=bench_clean_html)
+
+    alerts = sub.add_parser("alerts", help="alert rule engine vs per-rule scan")
+    alerts.add_argument("--size", type=int, default=20000, help="จำนวนข่าวที่ตรวจ")
+    alerts.add_argument("--rules", default=market_core.ALERT_RULES_FILE, help="ไฟล์กฎแจ้งเตือน")
+    alerts.set_defaults(func=bench_alerts)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
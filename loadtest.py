@@ -0,0 +1,368 @@
+"""ทดสอบโหลดของ dashboard ด้วย session จำลองหลายตัวพร้อมกัน
+
+แต่ละ session คือ streamlit AppTest ที่รัน app.py ใน thread ของตัวเอง (เหมือน Streamlit server
+ที่รันแต่ละ session เป็น thread ใน process เดียว) โดยชี้ Google News, Yahoo และ Google Translate
+ไปที่ HTTP server จำลองบน localhost ซึ่งนับจำนวนครั้งที่ถูกเรียกและหน่วงเวลาตอบตามที่กำหนด
+
+รายงานต่อจำนวน session: latency ของการ rerun (p50/p95/p99), จำนวนการเรียก upstream
+และหน่วยความจำต่อ session (จาก tracemalloc) เพื่อใช้วางแผน capacity
+
+วิธีใช้:
+    python loadtest.py --sessions 1,2,4,8 --reruns 5 [--latency 0.05] [--cold]
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlencode, urlparse
+from urllib.request import urlopen
+from xml.sax.saxutils import escape
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import SAMPLE_HEADLINES
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app.py')
+GOOGLE_NEWS_PREFIX = 'https://news.google.com/rss/search'
+# caption บรรทัดสุดท้ายของ app.py: run ที่ไม่แสดงบรรทัดนี้ถือว่าสคริปต์หยุดกลางทาง
+FOOTER_PREFIX = '🧠 SmartMarket Dashboard Pro'
+HISTORY_DAYS = {'2d': 2, '5d': 5, '1mo': 22, '2mo': 44, '6mo': 130, '1y': 260, '5y': 1300}
+
+
+class UpstreamServer:
+    """HTTP server จำลอง RSS, ประวัติราคา และการแปล พร้อมตัวนับจำนวน request"""
+    def __init__(self, latency=0.0, feed_rotate=60):
+        self.latency = latency
+        self.feed_rotate = feed_rotate
+        self.calls = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self._server.daemon_threads = True
+        self.url = f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def count(self, endpoint):
+        with self._lock:
+            self.calls[endpoint] += 1
+
+    def _handler(self):
+        upstream = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                parsed = urlparse(self.path)
+                query = {key: values[0] for key, values in parse_qs(parsed.query).items()}
+                endpoint = parsed.path.strip('/')
+                routes = {'rss': upstream.rss, 'history': upstream.history, 'translate': upstream.translate}
+                if endpoint not in routes:
+                    self.send_error(404)
+                    return
+                upstream.count(endpoint)
+                time.sleep(upstream.latency)
+                content_type, body = routes[endpoint](query)
+                self.send_response(200)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def rss(self, query):
+        """RSS 10 ข่าวต่อ feed โดยมีข่าวใหม่ทุก feed_rotate วินาที"""
+        topic = query.get('q', 'gold').split()[0]
+        generation = int(time.time() // self.feed_rotate)
+        items = []
+        for i in range(10):
+            n = generation * 10 + i
+            headline = SAMPLE_HEADLINES[n % len(SAMPLE_HEADLINES)]
+            published = time.strftime('%a, %d %b %Y %H:%M:%S GMT', time.gmtime(time.time() - i * 600))
+            description = f'<a href="https://example.com/{topic}/{n}">{headline}</a>&nbsp;<font>Reuters</font>'
+            items.append(
+                f"<item><title>{escape(headline)} ({topic} #{n})</title>"
+                f"<link>https://example.com/{topic}/{n}</link><guid>{topic}-{n}</guid>"
+                f"<description>{escape(description)}</description><pubDate>{published}</pubDate></item>")
+        body = f'<?xml version="1.0"?><rss version="2.0"><channel><title>{topic}</title>{"".join(items)}</channel></rss>'
+        return 'application/rss+xml', body.encode('utf-8')
+
+    def history(self, query):
+        """แท่งราคารายวันแบบ random walk (คงที่ต่อ symbol)"""
+        days = HISTORY_DAYS.get(query.get('period', '2d'), 2)
+        rng = np.random.default_rng(sum(map(ord, query.get('symbol', ''))))
+        close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, days)))
+        index = pd.bdate_range(end=pd.Timestamp.now(tz='UTC').normalize(), periods=days)
+        payload = {
+            'index': [ts.isoformat() for ts in index],
+            'Open': close.tolist(), 'High': (close * 1.005).tolist(),
+            'Low': (close * 0.995).tolist(), 'Close': close.tolist(),
+            'Volume': [1000.0] * days
+        }
+        return 'application/json', json.dumps(payload).encode('utf-8')
+
+    def translate(self, query):
+        return 'text/plain; charset=utf-8', ("[th] " + query.get('text', '')).encode('utf-8')
+
+
+def patch_upstreams(server_url):
+    """ชี้ feedparser, yfinance และ GoogleTranslator ไปที่ server จำลอง"""
+    import feedparser
+    import yfinance
+    from deep_translator import GoogleTranslator
+
+    original_parse = feedparser.parse
+
+    def parse(url, *args, **kwargs):
+        if isinstance(url, str) and url.startswith(GOOGLE_NEWS_PREFIX):
+            url = server_url + '/rss' + url[len(GOOGLE_NEWS_PREFIX):]
+        return original_parse(url, *args, **kwargs)
+
+    class Ticker:
+        def __init__(self, symbol):
+            self.symbol = symbol
+
+        def history(self, period='1mo', interval='1d', **kwargs):
+            query = urlencode({'symbol': self.symbol, 'period': period, 'interval': interval})
+            with urlopen(f'{server_url}/history?{query}', timeout=30) as response:
+                payload = json.load(response)
+            index = pd.DatetimeIndex(pd.to_datetime(payload.pop('index')), name='Date')
+            return pd.DataFrame(payload, index=index)
+
+    def translate(self, text, **kwargs):
+        with urlopen(f'{server_url}/translate?text={quote(text)}', timeout=30) as response:
+            return response.read().decode('utf-8')
+
+    feedparser.parse = parse
+    yfinance.Ticker = Ticker
+    GoogleTranslator.translate = translate
+
+
+class ScriptErrorLog(logging.Handler):
+    """เก็บ exception ที่ ScriptRunner log ไว้แต่ไม่ส่งถึง AppTest (เช่น compile error ของ app.py)"""
+    def __init__(self):
+        super().__init__(logging.ERROR)
+        self.errors = []
+        self._errors_lock = threading.Lock()
+
+    def emit(self, record):
+        message = record.getMessage()
+        if record.exc_info and record.exc_info[1] is not None:
+            error = record.exc_info[1]
+            message = f"{message}: {type(error).__name__}: {error}"
+        with self._errors_lock:
+            self.errors.append(message)
+
+    def drain(self):
+        with self._errors_lock:
+            errors, self.errors = self.errors, []
+        return errors
+
+
+def share_script_cache():
+    """ใช้ ScriptCache ตัวเดียวทุก session เหมือน Streamlit server และ compile app.py ก่อนเริ่ม thread
+
+    AppTest สร้าง ScriptCache ใหม่ทุกครั้งที่รัน ทำให้ compile สคริปต์พร้อมกันหลาย thread
+    ซึ่งไม่ตรงกับ server จริงและทำให้ CPython 3.11 เกิด SystemError ได้
+    """
+    from streamlit.runtime.scriptrunner.script_cache import ScriptCache
+    from streamlit.testing.v1 import app_test, local_script_runner
+
+    shared = ScriptCache()
+    shared.get_bytecode(APP_PATH)
+    # AppTest ใช้ ScriptCache กับ PagesManager ส่วน LocalScriptRunner สร้างของตัวเองไว้ compile สคริปต์
+    app_test.ScriptCache = lambda: shared
+    local_script_runner.ScriptCache = lambda: shared
+
+
+def capture_script_errors():
+    """ติด ScriptErrorLog กับ logger ของ ScriptRunner"""
+    handler = ScriptErrorLog()
+    logging.getLogger('streamlit.runtime.scriptrunner.script_runner').addHandler(handler)
+    return handler
+
+
+def percentile(values, q):
+    """percentile แบบ nearest-rank"""
+    if not values:
+        return float('nan')
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def render_failure(app):
+    """คืนสาเหตุถ้า run นี้ไม่ได้ render จนจบสคริปต์ (exception, st.stop หรือ compile error) ไม่เช่นนั้น None"""
+    if app.exception:
+        return "; ".join(e.message for e in app.exception)
+    if not any(caption.value.startswith(FOOTER_PREFIX) for caption in app.caption):
+        shown = [e.value for e in app.error]
+        return "incomplete render: " + ("; ".join(shown) if shown else "no output (script failed to compile or start)")
+    return None
+
+
+def run_session(session_id, reruns, timeout):
+    """รัน session หนึ่งตัว: โหลดครั้งแรก แล้ว rerun ตามจำนวนที่กำหนด
+
+    คืน (latency ของการโหลดครั้งแรกหรือ None ถ้าล้มเหลว, latency ของ rerun ที่สำเร็จ, errors)
+    run ที่ล้มเหลวไม่นับใน latency
+    """
+    from streamlit.testing.v1 import AppTest
+
+    app = AppTest.from_file(APP_PATH, default_timeout=timeout)
+    first = None
+    latencies = []
+    errors = []
+    for run in range(reruns + 1):
+        start = time.perf_counter()
+        try:
+            if run == 1 and app.sidebar.radio:
+                # แต่ละ session ใช้โหมดต่างกันเพื่อให้ครอบคลุมทุกหน้า
+                modes = app.sidebar.radio[0].options
+                app.sidebar.radio[0].set_value(modes[session_id % len(modes)]).run()
+            else:
+                app.run()
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+            continue
+        latency = time.perf_counter() - start
+        failure = render_failure(app)
+        if failure:
+            errors.append(failure)
+        elif run == 0:
+            first = latency
+        else:
+            latencies.append(latency)
+    return first, latencies, errors
+
+
+def run_level(sessions, args, server, workdir, script_errors):
+    """รัน session พร้อมกัน sessions ตัว คืนสถิติของระดับโหลดนี้"""
+    import streamlit as st
+
+    if args.cold:
+        # เริ่มจาก cache และ database ว่าง
+        st.cache_data.clear()
+        st.cache_resource.clear()
+        for name in ('market_data.db', 'shared_cache.db'):
+            for suffix in ('', '-wal', '-shm'):
+                path = os.path.join(workdir, name + suffix)
+                if os.path.exists(path):
+                    os.remove(path)
+
+    server.calls.clear()
+    script_errors.drain()
+    if args.memory:
+        tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as executor:
+        futures = [executor.submit(run_session, n, args.reruns, args.timeout) for n in range(sessions)]
+        outcomes = [future.result() for future in futures]
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+
+    # ไม่นับการโหลดครั้งแรกของแต่ละ session (รวมการ import และ cache ว่าง)
+    first = [latency for latency, _, _ in outcomes if latency is not None]
+    reruns = [latency for _, latencies, _ in outcomes for latency in latencies]
+    errors = [error for _, _, session_errors in outcomes for error in session_errors]
+    runs = len(first) + len(reruns)
+    return {
+        'sessions': sessions,
+        'runs': runs,
+        'first_p50': percentile(first, 50),
+        'p50': percentile(reruns, 50),
+        'p95': percentile(reruns, 95),
+        'p99': percentile(reruns, 99),
+        'max': max(reruns) if reruns else float('nan'),
+        'throughput': runs / elapsed,
+        'calls': dict(server.calls),
+        'mem_per_session': max(0, current - baseline) / sessions / 2 ** 20 if args.memory else None,
+        'peak_per_session': max(0, peak - baseline) / sessions / 2 ** 20 if args.memory else None,
+        'errors': errors,
+        'script_errors': script_errors.drain()
+    }
+
+
+def _megabytes(value):
+    return f"{value:>8.2f}" if value is not None else f"{'-':>8}"
+
+
+def print_report(rows):
+    header = (f"{'sessions':>8} {'runs':>5} {'first p50':>9} {'p50':>7} {'p95':>7} {'p99':>7} {'max':>7} "
+              f"{'runs/s':>7} {'rss':>5} {'hist':>5} {'trans':>5} {'MB/sess':>8} {'peak MB':>8} {'errors':>6}")
+    print(header)
+    print('-' * len(header))
+    for row in rows:
+        calls = row['calls']
+        print(f"{row['sessions']:>8} {row['runs']:>5} {row['first_p50']:>8.2f}s {row['p50']:>6.2f}s "
+              f"{row['p95']:>6.2f}s {row['p99']:>6.2f}s {row['max']:>6.2f}s {row['throughput']:>7.2f} "
+              f"{calls.get('rss', 0):>5} {calls.get('history', 0):>5} {calls.get('translate', 0):>5} "
+              f"{_megabytes(row['mem_per_session'])} {_megabytes(row['peak_per_session'])} {len(row['errors']):>6}")
+    for row in rows:
+        for error in sorted(set(row['errors'])):
+            print(f"[{row['sessions']} sessions] error: {error}")
+        for error in sorted(set(row['script_errors'])):
+            print(f"[{row['sessions']} sessions] script runner: {error}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the SmartMarket dashboard")
+    parser.add_argument('--sessions', default='1,2,4,8', help="จำนวน session พร้อมกันของแต่ละระดับ (คั่นด้วย ,)")
+    parser.add_argument('--reruns', type=int, default=5, help="จำนวน rerun ต่อ session หลังโหลดครั้งแรก")
+    parser.add_argument('--latency', type=float, default=0.05, help="เวลาตอบของ upstream จำลอง (วินาที)")
+    parser.add_argument('--feed-rotate', type=int, default=60, help="มีข่าวใหม่ใน feed จำลองทุกกี่วินาที")
+    parser.add_argument('--timeout', type=float, default=120, help="timeout ของการรันแต่ละครั้ง (วินาที)")
+    parser.add_argument('--cold', action='store_true', help="ล้าง cache และ database ก่อนแต่ละระดับ")
+    parser.add_argument('--no-memory', dest='memory', action='store_false',
+                        help="ไม่วัดหน่วยความจำ (tracemalloc ทำให้ทุก run ช้าลง)")
+    parser.add_argument('--workdir', help="โฟลเดอร์สำหรับ database ระหว่างทดสอบ (ค่าเริ่มต้น: โฟลเดอร์ชั่วคราว)")
+    args = parser.parse_args(argv)
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='smartmarket-loadtest-')
+    os.makedirs(workdir, exist_ok=True)
+    os.chdir(workdir)
+    os.environ['SMARTMARKET_CACHE_URL'] = 'sqlite:///' + os.path.join(workdir, 'shared_cache.db')
+
+    server = UpstreamServer(latency=args.latency, feed_rotate=args.feed_rotate).start()
+    patch_upstreams(server.url)
+    share_script_cache()
+    script_errors = capture_script_errors()
+    if args.memory:
+        tracemalloc.start()
+
+    rows = []
+    try:
+        for sessions in [int(n) for n in args.sessions.split(',') if n.strip()]:
+            print(f"running {sessions} concurrent session(s)...", flush=True)
+            rows.append(run_level(sessions, args, server, workdir, script_errors))
+    finally:
+        server.stop()
+        if not args.workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print()
+    print_report(rows)
+    return 1 if any(row['errors'] for row in rows) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,234 @@
+"""ค่าตั้งต้นและฟังก์ชันที่ใช้ร่วมกันระหว่าง app.py และสคริปต์ command line
+
+โมดูลนี้ต้องไม่ import streamlit เพื่อให้สคริปต์อย่าง backfill_news.py ใช้งานได้
+โดยไม่ต้องรัน dashboard
+"""
+import hashlib
+import html
+import html.entities
+import json
+import os
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+from bs4 import BeautifulSoup
+
+DB_PATH = 'market_data.db'
+
+# ---------- CONFIG ที่สอดคล้องกัน ----------
+RSS_FEEDS = [
+    "https://news.google.com/rss/search?q=gold+price+OR+XAUUSD&hl=en-US&gl=US&ceid=US:en",
+    "https://news.google.com/rss/search?q=silver+price+OR+XAGUSD&hl=en-US&gl=US&ceid=US:en",
+    "https://news.google.com/rss/search?q=bitcoin+OR+BTCUSD&hl=en-US&gl=US&ceid=US:en"
+]
+
+GOLD_KEYWORDS = ['gold', 'xau', 'bullion', 'precious metal', 'fed', 'inflation', 'dollar', 'usd', 'ทองคำ', 'xauusd']
+
+ASSETS = {
+    "ทองคำ (XAU)": GOLD_KEYWORDS,
+    "เงิน (XAG)": ["silver", "xagusd"],
+    "บิตคอยน์ (BTC)": ["bitcoin", "btc", "crypto"]
+}
+
+
+# tag ที่พบใน summary ของ Google News และตัดทิ้งได้โดยไม่ต้อง parse เต็มรูปแบบ
+SIMPLE_TAGS = {'a', 'b', 'i', 'u', 'em', 'strong', 'font', 'span', 'br', 'p', 'div',
+               'ol', 'ul', 'li', 'small', 'sup', 'sub', 'img'}
+SIMPLE_TAG_RE = re.compile(r"""</?([a-zA-Z][a-zA-Z0-9]*)(?:\s(?:[^>"']|"[^"]*"|'[^']*')*)?/?>""")
+NAMED_ENTITY_RE = re.compile(r'&([a-zA-Z][a-zA-Z0-9]*;)')
+COMPLETE_ENTITY_RE = re.compile(r'&(?:[a-zA-Z][a-zA-Z0-9]*|#[0-9]+|#[xX][0-9a-fA-F]+);')
+BARE_REFERENCE_RE = re.compile(r'&[#a-zA-Z0-9]')
+NUMERIC_ENTITY_RE = re.compile(r'&#(?:([0-9]+)|[xX]([0-9a-fA-F]+));')
+ASCII_SPACES = ' \t\n\x0c\r'
+CLEAN_HTML_CACHE_SIZE = 4096
+
+_clean_html_cache = OrderedDict()
+_clean_html_lock = threading.Lock()
+
+
+def _strip_simple_html(raw_html):
+    """ตัด tag และถอด entity ของ HTML แบบง่าย คืน None ถ้าต้องใช้ parser เต็มรูปแบบ"""
+    if '&' in raw_html:
+        if any(name not in html.entities.html5 for name in NAMED_ENTITY_RE.findall(raw_html)):
+            # entity ที่ไม่รู้จัก ให้ parser จัดการเพื่อให้ผลตรงกับ BeautifulSoup
+            return None
+        if BARE_REFERENCE_RE.search(COMPLETE_ENTITY_RE.sub('', raw_html)):
+            # entity ที่ไม่มี ; ปิดท้าย (เช่น &copy2024 หรือ AT&T) html.unescape ถอดต่างจาก BeautifulSoup
+            return None
+        for decimal, hexadecimal in NUMERIC_ENTITY_RE.findall(raw_html):
+            codepoint = int(decimal, 10) if decimal else int(hexadecimal, 16)
+            if codepoint < 0x20 or codepoint == 0x7f:
+                # อักขระควบคุม html.unescape ตัดทิ้งแต่ BeautifulSoup เก็บไว้
+                return None
+    if '<' in raw_html and any(tag.lower() not in SIMPLE_TAGS for tag in SIMPLE_TAG_RE.findall(raw_html)):
+        return None
+    # split คืน [ข้อความ, ชื่อ tag, ข้อความ, ...] จึงเลือกเฉพาะข้อความ
+    segments = SIMPLE_TAG_RE.split(raw_html)[::2]
+    if any('<' in segment for segment in segments):
+        # comment, CDATA หรือ tag ที่ไม่สมบูรณ์
+        return None
+    texts = []
+    for segment in segments:
+        text = html.unescape(segment)
+        if text and not text.strip(ASCII_SPACES):
+            # BeautifulSoup ยุบข้อความที่มีแต่ช่องว่างเหลือหนึ่งตัว
+            text = '\n' if '\n' in text else ' '
+        texts.append(text)
+    return ''.join(texts)
+
+
+def _clean_html_full(raw_html):
+    """แปลง HTML ด้วย BeautifulSoup (สำหรับ markup ที่ซับซ้อน)"""
+    try:
+        soup = BeautifulSoup(raw_html, "html.parser")
+        return soup.get_text()
+    except:
+        return raw_html
+
+
+def clean_html(raw_html):
+    """แปลง HTML เป็นข้อความ ใช้ fast path สำหรับ fragment ง่าย ๆ และ cache ผลตาม hash ของ input"""
+    if not raw_html:
+        return ""
+
+    key = hashlib.blake2b(raw_html.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+    with _clean_html_lock:
+        text = _clean_html_cache.get(key)
+        if text is not None:
+            _clean_html_cache.move_to_end(key)
+            return text
+
+    text = _strip_simple_html(raw_html)
+    if text is None:
+        text = _clean_html_full(raw_html)
+
+    with _clean_html_lock:
+        _clean_html_cache[key] = text
+        if len(_clean_html_cache) > CLEAN_HTML_CACHE_SIZE:
+            _clean_html_cache.popitem(last=False)
+    return text
+
+
+def classify_assets(content_lower):
+    """คืนรายชื่อสินทรัพย์ที่ข่าวเกี่ยวข้อง (ตาม keyword ใน ASSETS)"""
+    return [asset_name for asset_name, keywords in ASSETS.items()
+            if any(keyword in content_lower for keyword in keywords)]
+
+
+ALERT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'alert_rules.json')
+
+
+class AlertRuleEngine:
+    """กฎแจ้งเตือน (keyword/regex) ที่กรองด้วยสินทรัพย์และ sentiment ของข่าว
+
+    กฎแต่ละข้อ: id, category, keywords และ/หรือ regex, asset, min_sentiment, max_sentiment
+    keyword ต้องตรงทั้งคำ (ไม่นับเมื่อเป็นส่วนหนึ่งของคำภาษาอังกฤษอื่น เช่น "qe" ใน "unique")
+    keyword ของทุกกฎรวมเป็น regex เดียวไว้คัดข่าวที่ไม่ตรงกฎใดเลยออกก่อน ส่วนข่าวที่ผ่านจะตรวจ
+    กับ pattern ของแต่ละกฎ กฎหลายข้อที่ตรงข้อความเดียวกันจึงแจ้งเตือนครบทุกข้อ
+    """
+    def __init__(self, rules):
+        self.rules = rules
+        self.seen = set()  # ใช้เมื่อไม่มี database
+
+        self.patterns = []
+        keyword_alternatives = []
+        for rule in rules:
+            alternatives = [r'(?<![a-z0-9])' + re.escape(keyword.lower()) + r'(?![a-z0-9])'
+                            for keyword in rule.get('keywords', [])]
+            keyword_alternatives += alternatives
+            if rule.get('regex'):
+                # regex ของผู้ใช้คอมไพล์แยกต่อกฎ เพื่อไม่ให้ group หรือ backreference ปนกับกฎอื่น
+                alternatives.append(f"(?:{rule['regex']})")
+            self.patterns.append(re.compile('|'.join(alternatives), re.IGNORECASE) if alternatives else None)
+        self.prefilter = (re.compile('|'.join(keyword_alternatives), re.IGNORECASE)
+                          if keyword_alternatives else None)
+
+    def match(self, article):
+        """คืนกฎที่ข่าวนี้ตรงเงื่อนไขทั้งหมด (เรียงตามลำดับในไฟล์กฎ)"""
+        text = article['content_lower']
+        # ถ้าไม่มี keyword ใดเลย เหลือเฉพาะกฎที่มี regex ที่อาจตรง
+        keyword_hit = self.prefilter is not None and self.prefilter.search(text) is not None
+        sentiment = article.get('sentiment') or 0.0
+        fired = []
+        for rule, pattern in zip(self.rules, self.patterns):
+            if pattern is None or not (keyword_hit or rule.get('regex')):
+                continue
+            if rule.get('asset') and rule['asset'] not in article.get('assets', []):
+                continue
+            if rule.get('min_sentiment') is not None and sentiment < rule['min_sentiment']:
+                continue
+            if rule.get('max_sentiment') is not None and sentiment > rule['max_sentiment']:
+                continue
+            if pattern.search(text):
+                fired.append(rule)
+        return fired
+
+
+def article_key(guid, link, title):
+    """คีย์สำหรับ dedupe ข่าว: ใช้ guid ถ้ามี ไม่เช่นนั้นใช้ link หรือ hash ของหัวข้อ"""
+    if guid:
+        return guid
+    if link:
+        return link
+    return "sha1:" + hashlib.sha1((title or "").encode('utf-8')).hexdigest()
+
+
+def parse_published(published):
+    """แปลงวันที่เผยแพร่ (RFC 822 หรือ ISO 8601) เป็น epoch วินาที หรือ None"""
+    if not published:
+        return None
+    try:
+        dt = parsedate_to_datetime(published)
+    except (TypeError, ValueError):
+        try:
+            dt = datetime.fromisoformat(published.strip())
+        except ValueError:
+            return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return int(dt.timestamp())
+
+
+def init_meta_table(c):
+    """สร้างตาราง db_meta สำหรับเก็บค่าสถานะแบบ key-value (watermark, checkpoint)"""
+    c.execute('''CREATE TABLE IF NOT EXISTS db_meta
+                 (key TEXT PRIMARY KEY, value TEXT)''')
+
+
+def get_db_meta(c, key, default=None):
+    """อ่านค่าจากตาราง db_meta"""
+    c.execute('SELECT value FROM db_meta WHERE key = ?', (key,))
+    row = c.fetchone()
+    return row[0] if row else default
+
+
+def set_db_meta(c, key, value):
+    """บันทึกค่าลงตาราง db_meta"""
+    c.execute('INSERT OR REPLACE INTO db_meta (key, value) VALUES (?, ?)', (key, str(value)))
+
+
+def init_news_table(c):
+    """สร้างตาราง news_articles สำหรับเก็บข่าวที่ผ่านการวิเคราะห์แล้ว"""
+    c.execute('''CREATE TABLE IF NOT EXISTS news_articles
+                 (id INTEGER PRIMARY KEY, guid TEXT UNIQUE, feed TEXT,
+                  title TEXT, link TEXT, summary TEXT, published TEXT,
+                  published_ts INTEGER, assets TEXT, sentiment REAL,
+                  created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_news_articles_published
+                 ON news_articles (published_ts)''')
+
+
+def insert_articles(c, articles):
+    """บันทึกข่าวที่วิเคราะห์แล้ว (ข้ามข่าวที่มี guid ซ้ำ) และคืนจำนวนแถวที่เพิ่มจริง"""
+    before = c.connection.total_changes
+    c.executemany('''INSERT OR IGNORE INTO news_articles
+                     (guid, feed, title, link, summary, published, published_ts, assets, sentiment)
+                     VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                  [(a['guid'], a.get('feed', ''), a['title'], a['link'], a['summary_en'],
+                    a.get('published', ''), a.get('published_ts'),
+                    json.dumps(a.get('assets', []), ensure_ascii=False), a.get('sentiment'))
+                   for a in articles])
+    return c.connection.total_changes - before
@@ -0,0 +1,179 @@
+"""รายงานรายวันแบบ artifact (Markdown, CSV, JSON) และการส่งออกรายงานหลายวันเป็น zip
+
+artifact ถูกสร้างครั้งเดียวเมื่อ snapshot ของตลาดเปลี่ยน และเก็บใน report_artifacts
+โดยใช้ hash ของเนื้อหาเป็นคีย์ (เนื้อหาเดิมไม่ถูกบันทึกซ้ำ) ส่วน version นับต่อวันต่อชนิดรายงาน
+ปุ่มดาวน์โหลดจึงอ่านจาก database แทนการสร้างรายงานใหม่
+
+ส่งออกจาก command line:
+    python reports.py 2026-01-01 2026-03-31 --out reports-q1.zip
+"""
+import argparse
+import csv
+import hashlib
+import io
+import json
+import sqlite3
+import sys
+import tempfile
+import zipfile
+
+from market_core import DB_PATH
+
+REPORT_FORMATS = {
+    'md': 'text/markdown',
+    'csv': 'text/csv',
+    'json': 'application/json'
+}
+
+
+def init_report_tables(c):
+    """สร้างตาราง report_artifacts"""
+    c.execute('''CREATE TABLE IF NOT EXISTS report_artifacts
+                 (id INTEGER PRIMARY KEY, date TEXT, kind TEXT, format TEXT,
+                  version INTEGER, content_hash TEXT, content TEXT, created_at TEXT,
+                  UNIQUE (kind, format, content_hash))''')
+    c.execute('''CREATE INDEX IF NOT EXISTS idx_report_artifacts_date
+                 ON report_artifacts (date, kind, format, version)''')
+
+
+def content_hash(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+def snapshot_hash(snapshot):
+    """hash ของข้อมูลตั้งต้นของรายงาน (แนวโน้ม, sentiment, จำนวนข่าว และข่าวทองคำ)
+
+    ไม่รวมเวลาที่สร้างและ effective_count ซึ่งลดลงตามเวลาแม้ข่าวและราคาจะไม่เปลี่ยน
+    """
+    data = {
+        'date': snapshot['date'],
+        'results': {asset_name: {key: values[key] for key in ('trend', 'sentiment', 'article_count')}
+                    for asset_name, values in snapshot['results'].items()},
+        'gold_articles': snapshot.get('gold_articles', [])
+    }
+    return content_hash(json.dumps(data, ensure_ascii=False, sort_keys=True, default=str))
+
+
+def build_full_report(snapshot):
+    """สร้างรายงานภาพรวมตลาดทั้ง 3 รูปแบบจาก snapshot คืน {format: content}"""
+    results = snapshot['results']
+
+    lines = [
+        "# SmartMarket Dashboard Pro Report",
+        f"*วันที่: {snapshot['generated_at']}*",
+        "",
+        "| สินทรัพย์ | แนวโน้ม | Sentiment | จำนวนข่าว |",
+        "|---|---|---|---|"
+    ]
+    for asset_name, data in results.items():
+        lines.append(f"| {asset_name} | {data['trend']} | {data['sentiment']:.3f} | {data['article_count']} |")
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(['date', 'asset', 'trend', 'sentiment', 'article_count', 'effective_count'])
+    for asset_name, data in results.items():
+        writer.writerow([snapshot['date'], asset_name, data['trend'], round(data['sentiment'], 4),
+                         data['article_count'], round(data.get('effective_count', data['article_count']), 2)])
+
+    return {
+        'md': "\n".join(lines) + "\n",
+        'csv': buffer.getvalue(),
+        'json': json.dumps(snapshot, ensure_ascii=False, indent=2, default=str)
+    }
+
+
+def save_artifacts(c, date, kind, artifacts, created_at):
+    """บันทึก artifact ที่เนื้อหายังไม่เคยมี คืนจำนวนที่บันทึกใหม่"""
+    saved = 0
+    for fmt, content in artifacts.items():
+        digest = content_hash(content)
+        c.execute('SELECT 1 FROM report_artifacts WHERE kind = ? AND format = ? AND content_hash = ?',
+                  (kind, fmt, digest))
+        if c.fetchone():
+            continue
+        c.execute('SELECT COALESCE(MAX(version), 0) FROM report_artifacts WHERE date = ? AND kind = ? AND format = ?',
+                  (date, kind, fmt))
+        version = c.fetchone()[0] + 1
+        c.execute('''INSERT INTO report_artifacts (date, kind, format, version, content_hash, content, created_at)
+                     VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                  (date, kind, fmt, version, digest, content, created_at))
+        saved += 1
+    return saved
+
+
+def get_latest_artifact(c, kind, fmt, date=None):
+    """artifact ล่าสุดของชนิดและรูปแบบที่กำหนด (ของวันที่ date ถ้าระบุ) คืน dict หรือ None"""
+    query = 'SELECT date, version, content_hash, content FROM report_artifacts WHERE kind = ? AND format = ?'
+    params = [kind, fmt]
+    if date:
+        query += ' AND date = ?'
+        params.append(date)
+    c.execute(query + ' ORDER BY date DESC, version DESC LIMIT 1', params)
+    row = c.fetchone()
+    if row is None:
+        return None
+    return {'date': row[0], 'version': row[1], 'hash': row[2], 'content': row[3]}
+
+
+def iter_daily_artifacts(conn, start_date, end_date):
+    """artifact version ล่าสุดของแต่ละวัน/ชนิด/รูปแบบในช่วงวันที่ อ่านจาก cursor ทีละแถว"""
+    cursor = conn.execute('''SELECT a.date, a.kind, a.format, a.version, a.content_hash, a.content
+                             FROM report_artifacts a
+                             JOIN (SELECT date, kind, format, MAX(version) AS version
+                                   FROM report_artifacts WHERE date BETWEEN ? AND ?
+                                   GROUP BY date, kind, format) latest
+                               ON a.date = latest.date AND a.kind = latest.kind
+                              AND a.format = latest.format AND a.version = latest.version
+                             ORDER BY a.date, a.kind, a.format''', (start_date, end_date))
+    for row in cursor:
+        yield row
+
+
+def write_reports_zip(conn, start_date, end_date, fileobj):
+    """เขียนรายงานรายวันในช่วงวันที่ลง zip ทีละไฟล์ (ไม่โหลดทั้งหมดเข้า memory) คืนจำนวนไฟล์"""
+    count = 0
+    # zip เขียนได้ทีละไฟล์ จึงพัก manifest ไว้ใน temp file แล้วใส่เป็นไฟล์สุดท้าย
+    with tempfile.TemporaryFile('w+', encoding='utf-8', newline='') as manifest, \
+            zipfile.ZipFile(fileobj, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        writer = csv.writer(manifest)
+        writer.writerow(['date', 'kind', 'format', 'version', 'sha256', 'path'])
+        for date, kind, fmt, version, digest, content in iter_daily_artifacts(conn, start_date, end_date):
+            path = f"{date}/{kind}_v{version}.{fmt}"
+            archive.writestr(path, content)
+            writer.writerow([date, kind, fmt, version, digest, path])
+            count += 1
+
+        manifest.seek(0)
+        with archive.open('manifest.csv', 'w') as entry:
+            for line in manifest:
+                entry.write(line.encode('utf-8'))
+    return count
+
+
+def export_reports_zip(conn, start_date, end_date):
+    """สร้าง zip ของรายงานในช่วงวันที่ลงไฟล์ชั่วคราว คืน file object (อ่านอย่างเดียว) ที่ชี้ไปต้นไฟล์"""
+    fileobj = tempfile.TemporaryFile()
+    write_reports_zip(conn, start_date, end_date, fileobj)
+    fileobj.seek(0)
+    # st.download_button รับ BufferedReader แต่ไม่รับ BufferedRandom ที่ TemporaryFile คืนมา
+    return io.BufferedReader(fileobj.detach())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export daily SmartMarket reports to a zip archive")
+    parser.add_argument('start', help="วันที่เริ่มต้น (YYYY-MM-DD)")
+    parser.add_argument('end', help="วันที่สิ้นสุด (YYYY-MM-DD)")
+    parser.add_argument('--out', default='smartmarket-reports.zip', help="ไฟล์ zip ที่จะสร้าง")
+    parser.add_argument('--db', default=DB_PATH, help="path ของ database")
+    args = parser.parse_args(argv)
+
+    conn = sqlite3.connect(args.db)
+    with open(args.out, 'wb') as f:
+        count = write_reports_zip(conn, args.start, args.end, f)
+    conn.close()
+    print(f"{count} reports written to {args.out}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""งบเวลาต่อการ render, circuit breaker และ timeout สำหรับการเรียก upstream
+
+ทุกการเรียก upstream (Yahoo, Google Translate) รันใน thread pool ของ upstream นั้นเอง (upstream ที่ค้าง
+จึงไม่แย่ง worker ของตัวอื่น) และรอผลไม่เกินเวลาที่เหลือของ stage นั้น เมื่อ upstream ล้มเหลวติดกันหลายครั้ง circuit breaker จะเปิดและตอบกลับทันที
+(ให้ผู้เรียกใช้ค่า last-known-good) โดยระยะ backoff เพิ่มขึ้นเป็นเท่าตัวทุกครั้งที่ลองใหม่แล้วยังล้มเหลว
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+
+UPSTREAM_WORKERS = 8  # จำนวน worker ต่อ upstream
+
+
+class DeadlineExceeded(Exception):
+    """งบเวลาหมดก่อนได้ผลจาก upstream"""
+
+
+class CircuitOpenError(Exception):
+    """circuit breaker เปิดอยู่ จึงไม่เรียก upstream"""
+
+
+class Deadline:
+    """งบเวลาของการ render หนึ่งครั้ง แบ่งให้แต่ละ stage ตามน้ำหนัก
+
+    เวลาที่ stage ก่อนหน้าใช้ไม่หมดจะถูกส่งต่อให้ stage ที่เหลือตามสัดส่วน
+    """
+    def __init__(self, budget, stages=None):
+        self.budget = budget
+        self.expires_at = time.monotonic() + budget
+        self._pending = dict(stages or {})
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def stage(self, name):
+        """คืน Deadline ของ stage name (ส่วนแบ่งของเวลาที่เหลือตามน้ำหนักของ stage ที่ยังไม่เริ่ม)"""
+        weight = self._pending.pop(name, 0)
+        total = weight + sum(self._pending.values())
+        share = weight / total if total else 1.0
+        return Deadline(self.remaining() * share)
+
+
+class CircuitBreaker:
+    """circuit breaker ของ upstream หนึ่งตัว (closed -> open -> half-open)
+
+    timeout คือเวลารอเต็มของ upstream: การเรียกที่ถูกตัดก่อนเวลานี้เพราะงบของ stage ใกล้หมด
+    ไม่นับเป็นความล้มเหลวของ upstream (None = นับทุก timeout) และการเรียกที่ยังรอ worker อยู่ในคิว
+    จนหมดเวลาก็ไม่นับเช่นกัน
+    """
+    def __init__(self, name, timeout=None, failure_threshold=3, base_backoff=5.0, max_backoff=300.0,
+                 workers=UPSTREAM_WORKERS):
+        self.name = name
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.failures = 0
+        self.trips = 0
+        self.open_until = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f'upstream-{name}')
+
+    @property
+    def state(self):
+        if self.trips == 0:
+            return 'closed'
+        return 'open' if time.monotonic() < self.open_until else 'half-open'
+
+    def allow(self):
+        """อนุญาตให้เรียก upstream หรือไม่ (half-open ให้ลองได้ครั้งละหนึ่ง request)"""
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half-open' and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.trips = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                # เปิด circuit และเพิ่ม backoff เป็นเท่าตัวทุกครั้งที่ลองใหม่แล้วล้มเหลว
+                self.trips += 1
+                backoff = min(self.max_backoff, self.base_backoff * 2 ** (self.trips - 1))
+                self.open_until = time.monotonic() + backoff
+                self.failures = 0
+            self._probing = False
+
+    def release(self):
+        """ยกเลิกการเรียกที่ไม่ได้ผลชี้ขาด (ไม่นับเป็นสำเร็จหรือล้มเหลว)"""
+        with self._lock:
+            self._probing = False
+
+    def call(self, fn, timeout):
+        """เรียก fn() ใน thread pool ของ upstream นี้โดยรอไม่เกิน timeout วินาที"""
+        if timeout <= 0:
+            raise DeadlineExceeded(f"{self.name}: no time budget left")
+        if not self.allow():
+            raise CircuitOpenError(f"{self.name}: circuit open")
+        future = self._executor.submit(fn)
+        try:
+            result = future.result(timeout=timeout)
+        except FutureTimeout:
+            # cancel() สำเร็จเฉพาะเมื่อ fn ยังไม่เริ่มรัน (worker ทุกตัวยังติดการเรียกก่อนหน้า)
+            started = not future.cancel()
+            if started and (self.timeout is None or timeout >= self.timeout):
+                self.record_failure()
+            else:
+                # ถูกตัดด้วยงบเวลาของ render หรือยังไม่ได้เริ่มเรียก ไม่ใช่เพราะ upstream ช้าเกินเวลารอเต็ม
+                self.release()
+            raise DeadlineExceeded(f"{self.name}: no response within {timeout:.1f}s")
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
@@ -0,0 +1,169 @@
+"""Cache และ lease ที่ใช้ร่วมกันระหว่างหลาย Streamlit replica
+
+replica ที่ได้ lease ของ key จะเป็นผู้ดึงข้อมูลจาก upstream เพียงรายเดียว ส่วน replica อื่น
+รออ่านผลจาก cache (หรือใช้ค่าเก่าที่หมดอายุแล้วถ้ารอนานเกิน) ทำให้จำนวนครั้งที่เรียก upstream
+คงที่ไม่ว่าจะมีกี่ replica
+
+เลือก backend ด้วย environment variable SMARTMARKET_CACHE_URL:
+    sqlite:///shared_cache.db   (ค่าเริ่มต้น, ไฟล์ SQLite ที่ทุก replica บนเครื่องเดียวกันเข้าถึงได้)
+    redis://localhost:6379/0    (ต้องติดตั้ง redis)
+"""
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+
+# พยายาม import redis แต่ถ้าไม่มีให้ใช้ SQLite
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+DEFAULT_CACHE_URL = 'sqlite:///shared_cache.db'
+STALE_GRACE = 86400  # เก็บค่าที่หมดอายุไว้เป็น fallback อีก 1 วัน
+
+
+class SQLiteCacheBackend:
+    """Backend บนไฟล์ SQLite ใช้ lock ของ SQLite (BEGIN IMMEDIATE) ในการแย่ง lease"""
+    def __init__(self, path):
+        self.path = path
+        conn = self._connect()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('''CREATE TABLE IF NOT EXISTS cache_entries
+                        (key TEXT PRIMARY KEY, value TEXT, expires_at REAL)''')
+        conn.execute('''CREATE TABLE IF NOT EXISTS cache_leases
+                        (key TEXT PRIMARY KEY, owner TEXT, expires_at REAL)''')
+        conn.commit()
+        conn.close()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def get(self, key):
+        """คืน (value, expires_at) หรือ None"""
+        conn = self._connect()
+        row = conn.execute('SELECT value, expires_at FROM cache_entries WHERE key = ?', (key,)).fetchone()
+        conn.close()
+        if row is None:
+            return None
+        return json.loads(row[0]), row[1]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        conn = self._connect()
+        conn.execute('INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)',
+                     (key, json.dumps(value, ensure_ascii=False), now + ttl))
+        conn.execute('DELETE FROM cache_entries WHERE expires_at < ?', (now - STALE_GRACE,))
+        conn.close()
+
+    def acquire_lease(self, key, owner, lease_ttl):
+        """ได้ lease ถ้ายังไม่มีผู้ถือ หรือ lease เดิมหมดอายุแล้ว"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute('SELECT owner, expires_at FROM cache_leases WHERE key = ?', (key,)).fetchone()
+            if row and row[0] != owner and row[1] > now:
+                conn.execute('ROLLBACK')
+                return False
+            conn.execute('INSERT OR REPLACE INTO cache_leases (key, owner, expires_at) VALUES (?, ?, ?)',
+                         (key, owner, now + lease_ttl))
+            conn.execute('COMMIT')
+            return True
+        finally:
+            conn.close()
+
+    def release_lease(self, key, owner):
+        conn = self._connect()
+        conn.execute('DELETE FROM cache_leases WHERE key = ? AND owner = ?', (key, owner))
+        conn.close()
+
+
+class RedisCacheBackend:
+    """Backend บน Redis ใช้ SET NX PX สำหรับ lease"""
+    def __init__(self, url):
+        self.client = redis.Redis.from_url(url)
+
+    def get(self, key):
+        raw = self.client.get(f'cache:{key}')
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        return entry['value'], entry['expires_at']
+
+    def set(self, key, value, ttl):
+        entry = {'value': value, 'expires_at': time.time() + ttl}
+        self.client.set(f'cache:{key}', json.dumps(entry, ensure_ascii=False), ex=int(ttl + STALE_GRACE))
+
+    def acquire_lease(self, key, owner, lease_ttl):
+        lease_key = f'lease:{key}'
+        if self.client.set(lease_key, owner, nx=True, px=int(lease_ttl * 1000)):
+            return True
+        return self.client.get(lease_key) == owner.encode()
+
+    def release_lease(self, key, owner):
+        lease_key = f'lease:{key}'
+        if self.client.get(lease_key) == owner.encode():
+            self.client.delete(lease_key)
+
+
+def create_backend(url=None):
+    """สร้าง backend ตาม URL (ค่าเริ่มต้นจาก SMARTMARKET_CACHE_URL)"""
+    url = url or os.environ.get('SMARTMARKET_CACHE_URL', DEFAULT_CACHE_URL)
+    if url.startswith('redis://') or url.startswith('rediss://'):
+        if not HAS_REDIS:
+            raise RuntimeError("SMARTMARKET_CACHE_URL ใช้ redis แต่ยังไม่ได้ติดตั้ง package redis")
+        return RedisCacheBackend(url)
+    if url.startswith('sqlite:///'):
+        return SQLiteCacheBackend(url[len('sqlite:///'):])
+    raise ValueError(f"Unsupported cache URL: {url}")
+
+
+class SharedCache:
+    """Cache ที่ให้ replica เดียวถือ lease ในการดึงข้อมูลของแต่ละ key"""
+    def __init__(self, backend, wait_timeout=20, poll_interval=0.2):
+        self.backend = backend
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+
+    def peek(self, key):
+        """คืนค่าล่าสุดใน cache (แม้หมดอายุแล้ว) หรือ None"""
+        entry = self.backend.get(key)
+        return entry[0] if entry else None
+
+    def get_or_compute(self, key, ttl, compute, lease_ttl=60, wait_timeout=None):
+        """คืนค่าที่ยังไม่หมดอายุ ถ้าไม่มีให้ replica ที่ได้ lease เป็นผู้เรียก compute()"""
+        entry = self.backend.get(key)
+        if entry and entry[1] > time.time():
+            return entry[0]
+
+        # token ต่อการเรียก: session อื่นใน process เดียวกันก็ต้องรอ lease เช่นกัน
+        token = f"{self.owner}:{uuid.uuid4().hex[:8]}"
+        deadline = time.time() + (self.wait_timeout if wait_timeout is None else wait_timeout)
+        while True:
+            if self.backend.acquire_lease(key, token, lease_ttl):
+                try:
+                    # ผู้ถือ lease ก่อนหน้าอาจเพิ่งเขียนผลแล้วปล่อย lease ระหว่างที่เรารอ
+                    fresh = self.backend.get(key)
+                    if fresh and fresh[1] > time.time():
+                        return fresh[0]
+                    value = compute()
+                    self.backend.set(key, value, ttl)
+                    return value
+                finally:
+                    self.backend.release_lease(key, token)
+
+            # replica อื่นกำลังดึงข้อมูล: รอผลใน cache
+            time.sleep(self.poll_interval)
+            entry = self.backend.get(key) or entry
+            if entry and entry[1] > time.time():
+                return entry[0]
+            if time.time() >= deadline:
+                # รอนานเกินไป: ใช้ค่าเก่าถ้ามี (ผู้ถือ lease ที่หายไปจะหมด lease ตาม lease_ttl)
+                if entry:
+                    return entry[0]
+                raise TimeoutError(f"timed out waiting for the lease holder of {key}")